@@ -5,6 +5,9 @@ from sklearn.neighbors import NearestNeighbors
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 from sklearn.model_selection import train_test_split
 import json
+import argparse
+from delta_export import add_delta_arguments, export_with_delta, replace_with_delta
+from ranking_metrics import ranking_metrics
 
 def load_data():
     """Load data from Excel files (or CSV files)"""
@@ -42,8 +45,13 @@ def create_user_movie_matrix(ratings):
     
     return user_movie_matrix
 
-def train_knn_model(user_movie_matrix, k=40):
+def train_knn_model(user_movie_matrix, k=40, use_inverted_index=False):
     """Train KNN model for user-based collaborative filtering"""
+    if use_inverted_index:
+        # Exact same neighbors, but only users sharing a movie with the query are scored
+        from inverted_index import InvertedIndexNeighbors
+        return InvertedIndexNeighbors(n_neighbors=k).fit(user_movie_matrix)
+    
     # Use cosine similarity for KNN
     knn = NearestNeighbors(n_neighbors=k, metric='cosine', algorithm='brute')
     knn.fit(user_movie_matrix)
@@ -89,23 +97,6 @@ def get_recommendations(user_movie_matrix, knn_model, user_id, n_recommendations
     recommendations.sort(key=lambda x: x['score'], reverse=True)
     return recommendations[:n_recommendations]
 
-def calculate_precision_recall_at_k(actual_ratings, predicted_recommendations, k=10, threshold=3.5):
-    """Calculate Precision@k and Recall@k for a user"""
-    # Get actual highly rated movies (above threshold)
-    actual_high_rated = set(actual_ratings[actual_ratings >= threshold].index)
-    
-    # Get top-k predicted recommendations
-    predicted_movies = set([rec['movieId'] for rec in predicted_recommendations[:k]])
-    
-    # Calculate intersection
-    relevant_recommended = actual_high_rated.intersection(predicted_movies)
-    
-    # Calculate precision and recall
-    precision = len(relevant_recommended) / len(predicted_movies) if len(predicted_movies) > 0 else 0
-    recall = len(relevant_recommended) / len(actual_high_rated) if len(actual_high_rated) > 0 else 0
-    
-    return precision, recall
-
 def evaluate_model(ratings, user_movie_matrix, knn_model, test_size=0.25, k=10):
     """Evaluate the model using train-test split with multiple metrics"""
     # Split data by user to ensure proper evaluation
@@ -137,8 +128,7 @@ def evaluate_model(ratings, user_movie_matrix, knn_model, test_size=0.25, k=10):
     # Evaluation metrics
     predictions = []
     actuals = []
-    precision_scores = []
-    recall_scores = []
+    user_recommendations = {}
     
     # Evaluate on test set
     for user_id in test_users:
@@ -147,14 +137,8 @@ def evaluate_model(ratings, user_movie_matrix, knn_model, test_size=0.25, k=10):
             user_test_ratings = test_ratings[test_ratings['userId'] == user_id]
             
             if len(user_test_ratings) > 0:
-                # Get recommendations for this user
-                user_recommendations = get_recommendations(train_matrix, train_knn, user_id, n_recommendations=k)
-                
-                # Calculate precision and recall
-                user_actual_ratings = user_test_ratings.set_index('movieId')['rating']
-                precision, recall = calculate_precision_recall_at_k(user_actual_ratings, user_recommendations, k=k)
-                precision_scores.append(precision)
-                recall_scores.append(recall)
+                # Get recommendations for this user (ranking metrics are computed for all users at once below)
+                user_recommendations[user_id] = get_recommendations(train_matrix, train_knn, user_id, n_recommendations=k)
                 
                 # Calculate RMSE and MAE for rated movies
                 for _, row in user_test_ratings.iterrows():
@@ -182,14 +166,34 @@ def evaluate_model(ratings, user_movie_matrix, knn_model, test_size=0.25, k=10):
         metrics['MAE'] = mean_absolute_error(actuals, predictions)
         print(f"Evaluated {len(predictions)} predictions")
     
-    if len(precision_scores) > 0:
-        metrics['Precision@10'] = np.mean(precision_scores)
-        metrics['Recall@10'] = np.mean(recall_scores)
-        print(f"Evaluated precision/recall for {len(precision_scores)} users")
+    if len(user_recommendations) > 0:
+        metrics.update(ranking_metrics(user_recommendations, test_ratings, k=k, catalog_size=train_matrix.shape[1]))
+        print(f"Evaluated ranking metrics for {len(user_recommendations)} users")
     
     return metrics
 
 def main():
+    parser = argparse.ArgumentParser(description="Train the sklearn KNN model and export recommendations")
+    parser.add_argument("--memory-budget",
+                        help="e.g. 512MB: train and export on the sparse, blocked path sized to fit this budget")
+    add_delta_arguments(parser)
+    args = parser.parse_args()
+
+    if args.memory_budget:
+        # The dense matrix and the export dict below are what blow up on large data, so skip them entirely
+        from memory_budget import BudgetError, parse_size, run_budgeted_export, report
+        target = "knn_recs_sklearn.json.tmp" if args.delta_out else "knn_recs_sklearn.json"
+        try:
+            plan, tracker, users = run_budgeted_export(parse_size(args.memory_budget), out=target)
+        except BudgetError as e:
+            parser.error(str(e))
+        print(f"Wrote knn_recs_sklearn.json with {users} users (use approx_eval.py for metrics in this mode)")
+        report(plan, tracker)
+        if args.delta_out:
+            changes = replace_with_delta(target, "knn_recs_sklearn.json", args.delta_out, args.tolerance)
+            print(f"Wrote {args.delta_out} ({len(changes)} changed users)")
+        return
+
     # Load data
     ratings, links = load_data()
     
@@ -227,9 +231,13 @@ def main():
         ]
     
     # Save recommendations
-    with open("knn_recs_sklearn.json", "w") as f:
-        json.dump(export, f, indent=2)
-    print("\nWrote knn_recs_sklearn.json")
+    if args.delta_out:
+        changes = export_with_delta(export, "knn_recs_sklearn.json", args.delta_out, args.tolerance)
+        print(f"\nWrote knn_recs_sklearn.json and {args.delta_out} ({len(changes)} changed users)")
+    else:
+        with open("knn_recs_sklearn.json", "w") as f:
+            json.dump(export, f, indent=2)
+        print("\nWrote knn_recs_sklearn.json")
     
     # Show sample recommendations for first user
     first_user = list(export.keys())[0]
@@ -0,0 +1,312 @@
+# pip install pandas numpy scipy scikit-learn
+# Alternating least squares matrix factorization as a fast serving model
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from KNNtrain_sklearn import load_data, get_recommendations
+from delta_export import add_delta_arguments, export_with_delta
+from neighbor_graph import build_user_item_matrix
+from ranking_metrics import ranking_metrics
+from splits import split_ratings
+from sklearn.neighbors import NearestNeighbors
+
+
+def _outer(factors):
+    """Flattened outer product of each factor row with itself, shape (rows, f * f)"""
+    return (factors[:, :, None] * factors[:, None, :]).reshape(len(factors), -1)
+
+
+class ALSModel:
+    """Low-rank user/item factors fitted with alternating least squares.
+
+    Explicit mode factorizes mean-centered ratings with weighted-lambda
+    regularization. Implicit mode treats every rating as a positive
+    preference with confidence 1 + alpha * rating (Hu, Koren & Volinsky).
+    max_chunk_rows bounds the rows solved at once and max_outer_rows the
+    fixed factor rows whose f x f outer products are held at once, so
+    memory stays flat as the catalog grows.
+    """
+
+    def __init__(self, factors=32, regularization=0.1, iterations=15, implicit=False,
+                 alpha=10.0, random_state=42, max_chunk_rows=2048, max_outer_rows=2048):
+        self.factors = factors
+        self.regularization = regularization
+        self.iterations = iterations
+        self.implicit = implicit
+        self.alpha = alpha
+        self.random_state = random_state
+        self.max_chunk_rows = max_chunk_rows
+        self.max_outer_rows = max_outer_rows
+        self.user_factors = None
+        self.item_factors = None
+        self.global_mean = 0.0
+        self.user_ids = None
+        self.movie_ids = None
+
+    def fit(self, matrix, user_ids=None, movie_ids=None):
+        """Fit the factors on a sparse user x movie rating matrix"""
+        matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        n_users, n_items = matrix.shape
+        self.user_ids = np.arange(n_users) if user_ids is None else np.asarray(user_ids)
+        self.movie_ids = np.arange(n_items) if movie_ids is None else np.asarray(movie_ids)
+
+        if self.implicit:
+            self.global_mean = 0.0
+            values = matrix
+        else:
+            self.global_mean = float(matrix.data.mean()) if matrix.nnz else 0.0
+            values = matrix.copy()
+            values.data = values.data - self.global_mean
+
+        rng = np.random.default_rng(self.random_state)
+        self.user_factors = rng.normal(0, 0.01, (n_users, self.factors))
+        self.item_factors = rng.normal(0, 0.01, (n_items, self.factors))
+
+        values_t = values.T.tocsr()
+        for _ in range(self.iterations):
+            self.user_factors = self._solve(values, self.item_factors)
+            self.item_factors = self._solve(values_t, self.user_factors)
+        return self
+
+    def _solve(self, values, fixed):
+        """Solve the regularized least squares for every row of values at once"""
+        n_rows = values.shape[0]
+        f = self.factors
+        eye = np.eye(f)
+        # Small enough to build once and reuse for every chunk
+        outer = _outer(fixed) if len(fixed) <= self.max_outer_rows else None
+        gram = fixed.T @ fixed if self.implicit else None
+        solved = np.zeros((n_rows, f))
+
+        for start in range(0, n_rows, self.max_chunk_rows):
+            stop = min(start + self.max_chunk_rows, n_rows)
+            chunk = values[start:stop]
+
+            if self.implicit:
+                confidence = chunk.copy()
+                confidence.data = self.alpha * confidence.data
+                lhs = gram + self.regularization * eye + self._weighted_grams(confidence, fixed, outer)
+                confidence.data += 1.0
+                rhs = confidence @ fixed
+            else:
+                pattern = chunk.copy()
+                pattern.data = np.ones_like(pattern.data)
+                lhs = self._weighted_grams(pattern, fixed, outer)
+                rhs = chunk @ fixed
+                # Weighted-lambda: rows with more ratings get proportionally more regularization
+                counts = np.diff(chunk.indptr)
+                lhs += self.regularization * np.maximum(counts, 1)[:, None, None] * eye
+
+            solved[start:stop] = np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0]
+        return solved
+
+    def _weighted_grams(self, weights, fixed, outer=None):
+        """fixed.T @ diag(weights[r]) @ fixed for every row r of a sparse chunk, as a (rows, f, f) array.
+
+        These are sparse x dense products against the flattened outer
+        products of the fixed factors, so no Python loop over rows is needed.
+        The outer products take f * f floats per fixed row; unless the whole
+        table is passed in, they are built max_outer_rows at a time.
+        """
+        f = self.factors
+        if outer is not None:
+            return (weights @ outer).reshape(-1, f, f)
+        grams = np.zeros((weights.shape[0], f * f))
+        for start in range(0, len(fixed), self.max_outer_rows):
+            stop = min(start + self.max_outer_rows, len(fixed))
+            grams += weights[:, start:stop] @ _outer(fixed[start:stop])
+        return grams.reshape(-1, f, f)
+
+    def predict(self, user_rows, item_cols):
+        """Predict ratings (or preference scores) for aligned row/column positions"""
+        user_rows = np.asarray(user_rows)
+        item_cols = np.asarray(item_cols)
+        return self.global_mean + np.einsum('ij,ij->i', self.user_factors[user_rows], self.item_factors[item_cols])
+
+    def recommend_all(self, seen, n=10, batch_size=1024):
+        """Top-n unseen movie positions and scores for every user, one batch at a time"""
+        seen = sparse.csr_matrix(seen)
+        n_users = self.user_factors.shape[0]
+        top_items = np.zeros((n_users, n), dtype=np.int64)
+        top_scores = np.zeros((n_users, n))
+
+        for start in range(0, n_users, batch_size):
+            stop = min(start + batch_size, n_users)
+            scores = self.global_mean + self.user_factors[start:stop] @ self.item_factors.T
+            block = seen[start:stop]
+            scores[np.repeat(np.arange(stop - start), np.diff(block.indptr)), block.indices] = -np.inf
+
+            part = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+            part_scores = np.take_along_axis(scores, part, axis=1)
+            order = np.argsort(-part_scores, axis=1, kind='stable')
+            top_items[start:stop] = np.take_along_axis(part, order, axis=1)
+            top_scores[start:stop] = np.take_along_axis(part_scores, order, axis=1)
+        return top_items, top_scores
+
+    def save(self, path, **extra):
+        """Save factors and id mappings to a .npz file"""
+        np.savez(
+            path, user_factors=self.user_factors, item_factors=self.item_factors,
+            global_mean=self.global_mean, user_ids=self.user_ids, movie_ids=self.movie_ids,
+            implicit=self.implicit, regularization=self.regularization, alpha=self.alpha, **extra
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a model written by save"""
+        with np.load(path, allow_pickle=False) as f:
+            model = cls(factors=f['user_factors'].shape[1], regularization=float(f['regularization']),
+                        implicit=bool(f['implicit']), alpha=float(f['alpha']))
+            model.user_factors = f['user_factors']
+            model.item_factors = f['item_factors']
+            model.global_mean = float(f['global_mean'])
+            model.user_ids = f['user_ids']
+            model.movie_ids = f['movie_ids']
+        return model
+
+
+def build_export(recommendations, links):
+    """Map {userId: [{'movieId', 'score'}]} to the app's export format"""
+    mid2tmdb = dict(zip(links.movieId, links.tmdbId.fillna(-1).astype(int)))
+    return {
+        str(user_id): [
+            {"movieId": rec["movieId"], "tmdbId": int(mid2tmdb.get(rec["movieId"], -1)), "score": rec["score"]}
+            for rec in recs
+            if mid2tmdb.get(rec["movieId"], None) not in (None, -1)
+        ]
+        for user_id, recs in recommendations.items()
+    }
+
+
+def als_recommendations(model, matrix, n=10):
+    """Recommend for every user in one vectorized pass"""
+    top_items, top_scores = model.recommend_all(matrix, n=n)
+    return {
+        int(user_id): [
+            {'movieId': int(model.movie_ids[item]), 'score': float(score)}
+            for item, score in zip(items, scores) if np.isfinite(score)
+        ]
+        for user_id, items, scores in zip(model.user_ids, top_items, top_scores)
+    }
+
+
+def evaluate_als(model, train_matrix, test_ratings, k=10):
+    """RMSE/MAE on the held-out ratings plus Precision/Recall@k per test user"""
+    user_pos = pd.Index(model.user_ids)
+    movie_pos = pd.Index(model.movie_ids)
+    rows = user_pos.get_indexer(test_ratings['userId'])
+    cols = movie_pos.get_indexer(test_ratings['movieId'])
+    known = (rows >= 0) & (cols >= 0)
+
+    metrics = {}
+    # Implicit scores are preferences, not ratings, so only the ranking metrics apply
+    if known.any() and not model.implicit:
+        predicted = np.clip(model.predict(rows[known], cols[known]), 0.5, 5.0)
+        actual = test_ratings['rating'].to_numpy()[known]
+        metrics['RMSE'] = float(np.sqrt(np.mean((actual - predicted) ** 2)))
+        metrics['MAE'] = float(np.mean(np.abs(actual - predicted)))
+
+    recommendations = als_recommendations(model, train_matrix, n=k)
+    test_users = set(test_ratings['userId'])
+    recommendations = {user_id: recs for user_id, recs in recommendations.items() if user_id in test_users}
+    metrics.update(ranking_metrics(recommendations, test_ratings, k=k, catalog_size=len(model.movie_ids)))
+    return metrics
+
+
+def evaluate_knn(train_ratings, test_ratings, k=10):
+    """Evaluate KNNtrain_sklearn's model on the same rating split for a side-by-side comparison"""
+    train_matrix = train_ratings.pivot_table(index='userId', columns='movieId', values='rating', aggfunc='last').fillna(0)
+    knn = NearestNeighbors(n_neighbors=40, metric='cosine', algorithm='brute').fit(train_matrix)
+
+    predictions, actuals, recommendations = [], [], {}
+    for user_id, user_test in test_ratings.groupby('userId'):
+        if user_id not in train_matrix.index:
+            continue
+        recommendations[user_id] = get_recommendations(train_matrix, knn, user_id, n_recommendations=k)
+
+        distances, indices = knn.kneighbors([train_matrix.loc[user_id]])
+        weights = 1 / (distances[0] + 1e-6)
+        known = user_test[user_test['movieId'].isin(train_matrix.columns)]
+        if len(known):
+            similar = train_matrix.iloc[indices[0]][known['movieId']].to_numpy()
+            predictions.extend(np.average(similar, weights=weights, axis=0))
+            actuals.extend(known['rating'])
+
+    predictions, actuals = np.asarray(predictions), np.asarray(actuals)
+    metrics = {
+        'RMSE': float(np.sqrt(np.mean((actuals - predictions) ** 2))),
+        'MAE': float(np.mean(np.abs(actuals - predictions))),
+    }
+    metrics.update(ranking_metrics(recommendations, test_ratings, k=k, catalog_size=train_matrix.shape[1]))
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train an ALS model and compare it with the sklearn KNN")
+    parser.add_argument("--factors", type=int, default=32)
+    parser.add_argument("--regularization", type=float, default=0.1)
+    parser.add_argument("--iterations", type=int, default=15)
+    parser.add_argument("--implicit", action="store_true", help="use implicit-feedback confidence weighting")
+    parser.add_argument("--alpha", type=float, default=10.0, help="confidence scale for --implicit")
+    parser.add_argument("--skip-knn", action="store_true", help="skip the side-by-side KNN evaluation")
+    parser.add_argument("--model-out", default="als_model.npz")
+    parser.add_argument("--out", default="knn_recs_als.json")
+    add_delta_arguments(parser)
+    args = parser.parse_args()
+
+    ratings, links = load_data()
+    train_ratings, test_ratings = split_ratings(ratings)
+    print(f"Training on {len(train_ratings)} ratings, testing on {len(test_ratings)} ratings")
+
+    def new_model():
+        return ALSModel(factors=args.factors, regularization=args.regularization, iterations=args.iterations,
+                        implicit=args.implicit, alpha=args.alpha)
+
+    # Evaluate on the split
+    train_matrix, train_users, train_movies = build_user_item_matrix(train_ratings)
+    start = time.perf_counter()
+    model = new_model().fit(train_matrix, train_users, train_movies)
+    results = {'ALS': evaluate_als(model, train_matrix, test_ratings)}
+    results['ALS']['Seconds'] = time.perf_counter() - start
+
+    if not args.skip_knn:
+        start = time.perf_counter()
+        results['KNN (sklearn)'] = evaluate_knn(train_ratings, test_ratings)
+        results['KNN (sklearn)']['Seconds'] = time.perf_counter() - start
+
+    print("\n=== Model Performance ===")
+    print(pd.DataFrame(results).to_string(float_format=lambda v: f"{v:.4f}"))
+
+    # Retrain on all ratings and export
+    matrix, user_ids, movie_ids = build_user_item_matrix(ratings)
+    model = new_model().fit(matrix, user_ids, movie_ids)
+    # Seen items and tmdbIds let recommend.py answer queries from this file alone
+    tmdb_ids = links.set_index('movieId')['tmdbId'].reindex(movie_ids).fillna(-1).astype(np.int64).to_numpy()
+    model.save(args.model_out, seen_indptr=matrix.indptr, seen_indices=matrix.indices, tmdb_ids=tmdb_ids)
+    print(f"\nWrote {args.model_out}")
+
+    start = time.perf_counter()
+    export = build_export(als_recommendations(model, matrix, n=10), links)
+    print(f"Scored all {len(export)} users in {time.perf_counter() - start:.2f}s")
+
+    if args.delta_out:
+        changes = export_with_delta(export, args.out, args.delta_out, args.tolerance)
+        print(f"Wrote {args.out} and {args.delta_out} ({len(changes)} changed users)")
+    else:
+        with open(args.out, "w") as f:
+            json.dump(export, f, indent=2)
+        print(f"Wrote {args.out}")
+
+    print(f"\n=== Summary ===")
+    print(f"Total users: {len(export)}")
+    print(f"Average recommendations per user: {np.mean([len(recs) for recs in export.values()]):.1f}")
+    print(f"Total recommendations: {sum(len(recs) for recs in export.values())}")
+
+
+if __name__ == "__main__":
+    main()
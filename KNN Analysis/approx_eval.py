@@ -0,0 +1,223 @@
+# pip install pandas numpy scipy scikit-learn
+# Approximate evaluation: stratified user sampling with bootstrap confidence intervals and adaptive stopping
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import KNNtrain_sklearn
+from ranking_metrics import encode_recommendations, relevance_hits, compute_ranking_metrics
+from run_engines import ENGINES, SharedData
+
+RANKING_KEYS = {'Precision': 'precision', 'Recall': 'recall', 'NDCG': 'ndcg', 'MAP': 'average_precision',
+                'HitRate': 'hit'}
+# Default CI widths: error metrics are on the rating scale, ranking metrics on [0, 1]
+ERROR_TARGET_WIDTH = 0.25
+RANKING_TARGET_WIDTH = 0.05
+
+
+def metric_names(k):
+    """Every metric approximate_evaluation reports for cutoff k"""
+    return ['RMSE', 'MAE'] + [f'{name}@{k}' for name in RANKING_KEYS]
+
+
+def target_widths(metrics, k, widths=None):
+    """{metric: CI width to reach} for the tracked metrics.
+
+    widths may be a single width for every metric or a {metric: width} dict
+    overriding the defaults; unknown metric names raise ValueError.
+    """
+    known = metric_names(k)
+    unknown = [name for name in [*metrics, *(widths if isinstance(widths, dict) else {})] if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}; choose from {known}")
+    targets = {name: ERROR_TARGET_WIDTH if name in ('RMSE', 'MAE') else RANKING_TARGET_WIDTH for name in metrics}
+    if isinstance(widths, dict):
+        targets.update({name: width for name, width in widths.items() if name in targets})
+    elif widths is not None:
+        targets = dict.fromkeys(metrics, float(widths))
+    return targets
+
+
+def activity_strata(train, users, n_strata=4):
+    """Stratum per user from quantiles of their number of training ratings"""
+    counts = train['userId'].value_counts().reindex(users, fill_value=0).to_numpy()
+    edges = np.unique(np.quantile(counts, np.linspace(0, 1, n_strata + 1)[1:-1]))
+    return np.searchsorted(edges, counts, side='right')
+
+
+def allocate(remaining, round_size):
+    """Users to draw from each stratum this round, proportional to stratum size (largest remainder)"""
+    if remaining.sum() <= round_size:
+        return remaining.copy()
+    exact = round_size * remaining / remaining.sum()
+    counts = np.floor(exact).astype(int)
+    extra = np.argsort(-(exact - counts), kind='stable')[:round_size - counts.sum()]
+    counts[extra] += 1
+    return np.minimum(counts, remaining)
+
+
+class UserSample:
+    """Per-user metric contributions for the users evaluated so far"""
+
+    def __init__(self, k=10):
+        self.k = k
+        self.columns = {name: [] for name in ('stratum', 'sq_err', 'abs_err', 'n_pred', *RANKING_KEYS.values())}
+
+    def add(self, engine, users, strata, test, ratings_per_user, rng):
+        """Evaluate engine on a batch of users and store their per-user sums and ranking metrics"""
+        user_test = test[test['userId'].isin(users)]
+        if ratings_per_user:
+            # Cap each user's error-metric ratings so heavy raters don't dominate the cost
+            shuffled = user_test.iloc[rng.permutation(len(user_test))]
+            keep = shuffled.groupby('userId', sort=False).cumcount().to_numpy() < ratings_per_user
+            user_test = shuffled[keep]
+
+        predicted = engine.predict(user_test)
+        known = ~np.isnan(predicted)
+        rows = pd.Index(users).get_indexer(user_test['userId'])[known]
+        errors = user_test['rating'].to_numpy()[known] - predicted[known]
+        self.columns['sq_err'].append(np.bincount(rows, weights=errors ** 2, minlength=len(users)))
+        self.columns['abs_err'].append(np.bincount(rows, weights=np.abs(errors), minlength=len(users)))
+        self.columns['n_pred'].append(np.bincount(rows, minlength=len(users)).astype(float))
+
+        recommendations = engine.recommend([int(u) for u in users], n=self.k)
+        rec_users, items = encode_recommendations(recommendations, self.k)
+        hits, n_relevant = relevance_hits(rec_users, items, test, threshold=3.5)
+        per_user = compute_ranking_metrics(hits, n_relevant, (items >= 0).sum(axis=1), self.k)
+        order = pd.Index(rec_users).get_indexer(users)
+        for key in RANKING_KEYS.values():
+            self.columns[key].append(per_user[key][order])
+        self.columns['stratum'].append(strata)
+
+    def arrays(self):
+        return {name: np.concatenate(parts) for name, parts in self.columns.items()}
+
+    def __len__(self):
+        return sum(len(part) for part in self.columns['stratum'])
+
+
+def metric_values(arrays, draws, k):
+    """Every metric for each row of a (replicates x users) index matrix"""
+    n_pred = arrays['n_pred'][draws].sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = {
+            'RMSE': np.sqrt(arrays['sq_err'][draws].sum(axis=-1) / n_pred),
+            'MAE': arrays['abs_err'][draws].sum(axis=-1) / n_pred,
+        }
+    for name, key in RANKING_KEYS.items():
+        values[f'{name}@{k}'] = arrays[key][draws].mean(axis=-1)
+    return values
+
+
+def bootstrap(arrays, k, n_boot=500, confidence=0.95, rng=None):
+    """{metric: (estimate, low, high)} from a bootstrap that resamples users within each stratum"""
+    rng = rng or np.random.default_rng(42)
+    strata = arrays['stratum']
+    draws = np.concatenate([
+        rng.choice(members, size=(n_boot, len(members)))
+        for members in (np.flatnonzero(strata == s) for s in np.unique(strata))
+    ], axis=1)
+    estimates = metric_values(arrays, np.arange(len(strata)), k)
+    replicates = metric_values(arrays, draws, k)
+    tail = (1 - confidence) / 2 * 100
+    return {
+        name: (float(estimates[name]), *map(float, np.nanpercentile(replicates[name], [tail, 100 - tail])))
+        for name in estimates
+    }
+
+
+def approximate_evaluation(engine, data, k=10, target_width=None, metrics=None,
+                           round_size=50, min_users=100, max_users=None, ratings_per_user=None,
+                           n_strata=4, n_boot=500, confidence=0.95, seed=42, verbose=True):
+    """Evaluate growing stratified user samples until every tracked CI is narrower than its target width.
+
+    metrics defaults to RMSE and Precision@k; target_width is passed to
+    target_widths, so it may be None, one width or a {metric: width} dict.
+    """
+    targets = target_widths(metrics or ['RMSE', f'Precision@{k}'], k, target_width)
+    rng = np.random.default_rng(seed)
+    candidates = np.intersect1d(data.test['userId'].unique(), data.user_ids)
+    strata = activity_strata(data.train, candidates, n_strata)
+    pools = [rng.permutation(candidates[strata == s]) for s in range(strata.max() + 1)]
+    taken = np.zeros(len(pools), dtype=int)
+    max_users = min(max_users or len(candidates), len(candidates))
+
+    sample = UserSample(k)
+    intervals = {}
+    while len(sample) < max_users:
+        remaining = np.array([len(pool) for pool in pools]) - taken
+        counts = allocate(remaining, min(round_size, max_users - len(sample)))
+        batch = [(pools[s][taken[s]:taken[s] + c], s) for s, c in enumerate(counts) if c]
+        taken += counts
+        users = np.concatenate([members for members, _ in batch])
+        batch_strata = np.concatenate([np.full(len(members), s) for members, s in batch])
+        sample.add(engine, users, batch_strata, data.test, ratings_per_user, rng)
+
+        intervals = bootstrap(sample.arrays(), k, n_boot, confidence, rng)
+        widths = {name: intervals[name][2] - intervals[name][1] for name in targets}
+        if verbose:
+            print(f"  {len(sample)} users: " + ", ".join(f"{name} ±{width / 2:.4f}" for name, width in widths.items()))
+        if len(sample) >= min_users and all(widths[name] <= width for name, width in targets.items()):
+            break
+    return intervals, len(sample), len(candidates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Approximate engine evaluation with bootstrap confidence intervals")
+    parser.add_argument("--engine", default="sklearn", choices=list(ENGINES))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--target-width", nargs="+", metavar="[METRIC=]WIDTH",
+                        help=f"CI width to reach: one width for every metric, or METRIC=WIDTH pairs "
+                             f"(default {ERROR_TARGET_WIDTH} for RMSE/MAE, {RANKING_TARGET_WIDTH} for @k metrics)")
+    parser.add_argument("--metrics", nargs="+", help="metrics whose CI width decides when to stop "
+                                                     "(default RMSE and Precision@k)")
+    parser.add_argument("--round-size", type=int, default=50, help="users added per round")
+    parser.add_argument("--min-users", type=int, default=100)
+    parser.add_argument("--max-users", type=int)
+    parser.add_argument("--ratings-per-user", type=int, help="cap on test ratings per user for RMSE/MAE")
+    parser.add_argument("--strata", type=int, default=4, help="user activity strata")
+    parser.add_argument("--bootstrap", type=int, default=500, help="bootstrap replicates")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    args = parser.parse_args()
+
+    metrics = args.metrics or ['RMSE', f'Precision@{args.k}']
+    widths = None
+    if args.target_width:
+        try:
+            if len(args.target_width) == 1 and "=" not in args.target_width[0]:
+                widths = float(args.target_width[0])
+            else:
+                widths = {name: float(width) for name, _, width in (w.partition("=") for w in args.target_width)}
+            targets = target_widths(metrics, args.k, widths)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        targets = target_widths(metrics, args.k)
+
+    ratings, links = KNNtrain_sklearn.load_data()
+    data = SharedData(ratings, links)
+    engine = ENGINES[args.engine]()
+
+    start = time.perf_counter()
+    engine.fit(data)
+    fit_seconds = time.perf_counter() - start
+
+    print(f"Sampling users for {args.engine} until each {args.confidence:.0%} CI is narrower than "
+          + ", ".join(f"{name} {width}" for name, width in targets.items()))
+    start = time.perf_counter()
+    intervals, n_users, n_candidates = approximate_evaluation(
+        engine, data, k=args.k, target_width=targets, metrics=metrics, round_size=args.round_size,
+        min_users=args.min_users, max_users=args.max_users, ratings_per_user=args.ratings_per_user,
+        n_strata=args.strata, n_boot=args.bootstrap, confidence=args.confidence)
+    eval_seconds = time.perf_counter() - start
+
+    print(f"\n=== Approximate Evaluation ({n_users} of {n_candidates} users) ===")
+    for name, (estimate, low, high) in intervals.items():
+        print(f"{name}: {estimate:.4f}  [{low:.4f}, {high:.4f}]")
+    print(f"\nFit: {fit_seconds:.2f}s, evaluation: {eval_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
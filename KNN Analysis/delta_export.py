@@ -0,0 +1,152 @@
+# Delta export: write only the users whose recommendations changed since the last run
+import argparse
+import json
+import os
+
+# Relative score change below which a user's list counts as unchanged: far above the float noise of
+# rerunning a pipeline (or computing it sharded), far below any change a user could notice
+DEFAULT_TOLERANCE = 1e-3
+
+
+def load_export(path):
+    """Load a knn_recs_*.json export, or an empty export if the file does not exist"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _user_sort_key(user_id):
+    """Order numeric user ids numerically and everything else after them as strings"""
+    user_id = str(user_id)
+    return (0, int(user_id), "") if user_id.isdigit() else (1, 0, user_id)
+
+
+def recs_equal(old_recs, new_recs, tolerance=DEFAULT_TOLERANCE):
+    """True when both lists hold the same movies in the same order with scores within a relative tolerance"""
+    if len(old_recs) != len(new_recs):
+        return False
+    for old, new in zip(old_recs, new_recs):
+        if old["movieId"] != new["movieId"] or old.get("tmdbId") != new.get("tmdbId"):
+            return False
+        if abs(old["score"] - new["score"]) > tolerance * max(abs(old["score"]), abs(new["score"])):
+            return False
+    return True
+
+
+def diff_exports(previous, current, tolerance=DEFAULT_TOLERANCE):
+    """Return the change set that turns previous into current, ordered by user id"""
+    changes = []
+    for user_id in sorted(set(previous) | set(current), key=_user_sort_key):
+        if user_id not in current:
+            changes.append({"op": "delete", "userId": user_id})
+        elif user_id not in previous or not recs_equal(previous[user_id], current[user_id], tolerance):
+            changes.append({"op": "upsert", "userId": user_id, "recs": current[user_id]})
+    return changes
+
+
+def write_changeset(changes, path):
+    """Write one change per line as compact, key-sorted JSON"""
+    with open(path, "w") as f:
+        for change in changes:
+            f.write(json.dumps(change, sort_keys=True, separators=(",", ":")) + "\n")
+
+
+def read_changeset(path):
+    """Yield the changes stored in an NDJSON change set"""
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def export_with_delta(export, out_path, changes_path, tolerance=DEFAULT_TOLERANCE):
+    """Diff export against the artifact already at out_path, write the change set, then overwrite it"""
+    changes = diff_exports(load_export(out_path), export, tolerance)
+    write_changeset(changes, changes_path)
+    with open(out_path, "w") as f:
+        json.dump(export, f, indent=2)
+    return changes
+
+
+def replace_with_delta(new_path, out_path, changes_path, tolerance=DEFAULT_TOLERANCE):
+    """Diff a streamed export at new_path against out_path, write the change set, then move new_path over out_path"""
+    changes = diff_exports(load_export(out_path), load_export(new_path), tolerance)
+    write_changeset(changes, changes_path)
+    os.replace(new_path, out_path)
+    return changes
+
+
+def add_delta_arguments(parser):
+    """--delta-out and --tolerance for scripts that write a knn_recs_*.json export"""
+    parser.add_argument("--delta-out", help="also write an NDJSON change set against the previous export")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative score change treated as unchanged in the change set")
+
+
+class LocalStore:
+    """Stand-in for the app's Firestore recommendations collection, kept in a JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.docs = load_export(path)
+        self.writes = 0
+
+    def set(self, user_id, recs):
+        self.docs[user_id] = recs
+        self.writes += 1
+
+    def delete(self, user_id):
+        if self.docs.pop(user_id, None) is not None:
+            self.writes += 1
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump(self.docs, f, indent=2)
+
+
+def apply_changeset(store, changes):
+    """Apply upserts and deletes to store and return how many of each were applied"""
+    applied = {"upsert": 0, "delete": 0}
+    for change in changes:
+        if change["op"] == "upsert":
+            store.set(change["userId"], change["recs"])
+        elif change["op"] == "delete":
+            store.delete(change["userId"])
+        else:
+            raise ValueError(f"Unknown change op: {change['op']}")
+        applied[change["op"]] += 1
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute or apply a per-user recommendation change set")
+    parser.add_argument("current", help="new export, e.g. knn_recs_sklearn.json")
+    parser.add_argument("--previous", help="previous export to compare against")
+    parser.add_argument("--out", default="recs_changes.ndjson")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative score change treated as unchanged (movie order must always match)")
+    parser.add_argument("--apply", metavar="STORE", help="apply the change set to a local JSON store")
+    args = parser.parse_args()
+
+    previous = load_export(args.previous)
+    current = load_export(args.current)
+    changes = diff_exports(previous, current, args.tolerance)
+    write_changeset(changes, args.out)
+
+    upserts = sum(1 for c in changes if c["op"] == "upsert")
+    deletes = len(changes) - upserts
+    print(f"Compared {len(previous)} previous users with {len(current)} current users")
+    print(f"Wrote {args.out}: {upserts} upserts, {deletes} deletes "
+          f"({len(changes)} writes instead of {len(current)} for a full rewrite)")
+
+    if args.apply:
+        store = LocalStore(args.apply)
+        applied = apply_changeset(store, read_changeset(args.out))
+        store.save()
+        print(f"Applied {applied['upsert']} upserts and {applied['delete']} deletes to {args.apply} "
+              f"({len(store.docs)} users stored)")
+
+
+if __name__ == "__main__":
+    main()
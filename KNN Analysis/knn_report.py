@@ -0,0 +1,174 @@
+# pip install numpy scipy
+# Precompute the KNNAnalysis page for every app user in one batch over the sparse watched matrices
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from neighbor_graph import select_topk
+from social_neighbors import (MIN_WATCHED, FRIEND_BOOST, load_snapshot, content_key, build_watched_matrices,
+                              build_friend_matrix, common_item_similarity)
+
+# Same buckets as KNNAnalyzer.calculateSimilarityDistribution
+BUCKETS = ['0.0-0.1', '0.1-0.2', '0.2-0.3', '0.3-0.4', '0.4-0.5', '0.5+']
+BUCKET_EDGES = [0.1, 0.2, 0.3, 0.4, 0.5]
+FIELDS = {
+    "topSimilarUsers": ["uid", "username", "similarity", "commonItems", "isFriend"],
+    "neighbors": ["uid", "username", "similarity", "commonItems", "isFriend"],
+    "contributions": ["uid", "rating", "similarity", "contribution"],
+}
+
+
+def content_metadata(watched):
+    """content key -> {id, title, poster, media_type} from the first watched entry that mentions it"""
+    metadata = {}
+    for items in watched.values():
+        for item in (items or {}).values():
+            if isinstance(item, dict) and "id" in item:
+                metadata.setdefault(content_key(item), {
+                    "id": item["id"], "title": item.get("title"), "poster": item.get("poster"),
+                    "media_type": item.get("media_type") or "movie",
+                })
+    return metadata
+
+
+def similarity_summary(sims, candidates, is_friend):
+    """Per-row totals, averages and histograms of the unboosted similarities over candidate users"""
+    n_candidates = candidates.sum(axis=1)
+    masked = np.where(candidates, sims, 0.0)
+    friends = candidates & is_friend
+    others = candidates & ~is_friend
+    buckets = np.digitize(sims, BUCKET_EDGES)
+    rows = np.broadcast_to(np.arange(len(sims))[:, None], sims.shape)
+    histogram = np.bincount((rows * len(BUCKETS) + buckets)[candidates],
+                            minlength=len(sims) * len(BUCKETS)).reshape(len(sims), len(BUCKETS))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            "totalUsersAnalyzed": n_candidates,
+            "usersWithSimilarity": (candidates & (sims > 0)).sum(axis=1),
+            "averageSimilarity": np.nan_to_num(masked.sum(axis=1) / n_candidates),
+            "friendAverageSimilarity": np.nan_to_num((masked * friends).sum(axis=1) / friends.sum(axis=1)),
+            "nonFriendAverageSimilarity": np.nan_to_num((masked * others).sum(axis=1) / others.sum(axis=1)),
+            "histogram": histogram,
+        }
+
+
+def neighbor_recommendations(row, neighbor_rows, neighbor_sims, ratings, pattern, keys, uids, limit=18):
+    """getRecommendationsFromNeighbors for one user, keeping every neighbor's contribution"""
+    watched = set(pattern.indices[pattern.indptr[row]:pattern.indptr[row + 1]])
+    recs = {}
+    for neighbor, similarity in zip(neighbor_rows, neighbor_sims):
+        if similarity <= 0:
+            continue
+        rated = dict(zip(ratings[neighbor].indices, ratings[neighbor].data))
+        for col in pattern.indices[pattern.indptr[neighbor]:pattern.indptr[neighbor + 1]]:
+            if col in watched:
+                continue
+            rating = float(rated.get(col, 0.0))
+            rec = recs.setdefault(col, {"score": 0.0, "contributions": []})
+            rec["score"] += similarity * rating
+            rec["contributions"].append([uids[neighbor], rating, round(float(similarity), 6),
+                                         round(float(similarity * rating), 6)])
+    # Stable sort by score, like the app's Array.sort over insertion order
+    ranked = sorted(recs.items(), key=lambda entry: -entry[1]["score"])[:limit]
+    return [{"key": keys[col], "score": round(rec["score"], 6), "count": len(rec["contributions"]),
+             "contributions": rec["contributions"]} for col, rec in ranked]
+
+
+def build_report(users, watched, k=15, top_similar=10, rec_limit=18, block_size=1024):
+    """{uid: report} with similarity stats, neighbor lists and per-neighbor recommendation contributions"""
+    ratings, pattern, uids, keys = build_watched_matrices(users, watched)
+    friends = build_friend_matrix(users, uids)
+    squared = ratings.multiply(ratings).tocsr()
+    usernames = [users[uid].get("username") for uid in uids]
+    n_users = len(uids)
+    watched_counts = np.diff(pattern.indptr)
+    eligible = watched_counts >= MIN_WATCHED
+
+    reports = {}
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        sims = common_item_similarity(ratings, squared, pattern, start, stop)
+        common = (pattern[start:stop] @ pattern.T).toarray().astype(int)
+        is_friend = friends[start:stop].toarray() > 0
+
+        # Candidates are what getAllUsersWatched returns: everyone else with enough history
+        candidates = np.broadcast_to(eligible, sims.shape).copy()
+        candidates[np.arange(stop - start), np.arange(start, stop)] = False
+        summary = similarity_summary(sims, candidates, is_friend)
+
+        idx = np.broadcast_to(np.arange(n_users), sims.shape)
+        top_sims, top_idx = select_topk(np.where(candidates, sims, -np.inf), idx, min(top_similar, n_users))
+        boosted = np.where(is_friend, sims * FRIEND_BOOST, sims)
+        nbr_sims, nbr_idx = select_topk(np.where(candidates, boosted, -np.inf), idx, min(k, n_users))
+
+        for offset in range(stop - start):
+            row = start + offset
+
+            def user_rows(sim_row, idx_row):
+                return [[uids[j], usernames[j], round(float(s), 6), int(common[offset, j]), bool(is_friend[offset, j])]
+                        for j, s in zip(idx_row, sim_row) if np.isfinite(s)]
+
+            neighbor_mask = np.isfinite(nbr_sims[offset])
+            reports[uids[row]] = {
+                "username": usernames[row],
+                "watchedCount": int(watched_counts[row]),
+                "similarity": {
+                    **{name: (round(float(values[offset]), 6) if values.dtype.kind == 'f' else int(values[offset]))
+                       for name, values in summary.items() if name != "histogram"},
+                    "distribution": dict(zip(BUCKETS, map(int, summary["histogram"][offset]))),
+                },
+                "topSimilarUsers": user_rows(top_sims[offset], top_idx[offset]),
+                "neighbors": user_rows(nbr_sims[offset], nbr_idx[offset]),
+                "recommendations": neighbor_recommendations(row, nbr_idx[offset][neighbor_mask],
+                                                            nbr_sims[offset][neighbor_mask],
+                                                            ratings, pattern, keys, uids, rec_limit),
+            }
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the KNN analysis report for every app user")
+    parser.add_argument("snapshot", help="JSON export of the users and watched collections")
+    parser.add_argument("--k", type=int, default=15, help="neighbors used for recommendations (the app uses 15)")
+    parser.add_argument("--top-similar", type=int, default=10)
+    parser.add_argument("--recs", type=int, default=18, help="recommendations kept per user")
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--out", default="knn_analysis_report.json")
+    parser.add_argument("--per-user-dir", help="also write one <uid>.json per user")
+    args = parser.parse_args()
+
+    users, watched = load_snapshot(args.snapshot)
+    print(f"Loaded {len(users)} users and {len(watched)} watched docs")
+
+    start = time.perf_counter()
+    reports = build_report(users, watched, args.k, args.top_similar, args.recs, args.block_size)
+    elapsed = time.perf_counter() - start
+
+    # Titles and posters are stored once per content key instead of inside every recommendation
+    used = {rec["key"] for report in reports.values() for rec in report["recommendations"]}
+    content = {key: meta for key, meta in content_metadata(watched).items() if key in used}
+    with open(args.out, "w") as f:
+        json.dump({"buckets": BUCKETS, "fields": FIELDS, "content": content, "users": reports},
+                  f, separators=(",", ":"))
+    print(f"Wrote {args.out} in {elapsed:.2f}s")
+
+    if args.per_user_dir:
+        os.makedirs(args.per_user_dir, exist_ok=True)
+        for uid, report in reports.items():
+            keys = {rec["key"] for rec in report["recommendations"]}
+            with open(os.path.join(args.per_user_dir, f"{uid}.json"), "w") as f:
+                json.dump({"buckets": BUCKETS, "fields": FIELDS,
+                           "content": {key: content[key] for key in keys}, **report}, f, separators=(",", ":"))
+        print(f"Wrote {len(reports)} per-user reports to {args.per_user_dir}/")
+
+    print(f"\n=== Summary ===")
+    print(f"Users with at least one neighbor: {sum(1 for r in reports.values() if r['neighbors'])} of {len(reports)}")
+    print(f"Users with recommendations: {sum(1 for r in reports.values() if r['recommendations'])}")
+
+
+if __name__ == "__main__":
+    main()
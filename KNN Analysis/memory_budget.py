@@ -0,0 +1,281 @@
+# pip install pandas numpy scipy
+# Memory-budgeted KNN training and export: block sizes come from the budget, large intermediates spill to disk
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from delta_export import add_delta_arguments, replace_with_delta
+from neighbor_graph import (build_user_item_matrix, iter_topk_blocks, load_neighbor_graph, neighbor_weights,
+                            score_rows, top_n, write_neighbor_graph)
+
+# Rough bytes per element of the temporaries each stage creates, measured on ml-latest-small
+TILE_BYTES = 48      # sparse tile product, dense tile, hstack'ed sims/idx and argpartition output
+SCORE_BYTES = 48     # neighbor x rating product, dense scores, masks and the top-n sort
+MATRIX_BYTES = 32    # CSR ratings plus the float32 normalized copy, per rating
+RATING_BYTES = 24    # 32-bit userId, movieId and rating per row, plus read_csv parse buffers
+UNITS = {"": 1, "B": 1, "KB": 2 ** 10, "MB": 2 ** 20, "GB": 2 ** 30}
+
+
+class BudgetError(ValueError):
+    """The memory budget cannot be parsed or is too small to plan the pipeline in"""
+
+
+def parse_size(text):
+    """'512MB' -> 536870912"""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?B?)\s*", str(text).upper())
+    if not match:
+        raise BudgetError(f"Cannot parse memory size {text!r}")
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+def current_rss():
+    """Resident set size of this process in bytes (max RSS so far where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return max_rss() or 0
+
+
+def max_rss():
+    """Peak resident set size of this process in bytes, or None where the resource module is missing"""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KB on Linux
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def plan_pipeline(n_users, n_items, n_ratings, budget, k=40, baseline=0):
+    """Per-stage footprint estimates plus the block sizes and spill decision that fit in budget bytes.
+
+    baseline is memory the process already holds (interpreter, libraries),
+    which the budget has to cover before any data is loaded.
+    """
+    budget_mb, baseline_mb = budget / 2 ** 20, baseline / 2 ** 20
+    if baseline >= budget:
+        raise BudgetError(f"A budget of {budget_mb:.0f} MB is less than the {baseline_mb:.0f} MB "
+                          f"the interpreter and libraries already use; raise --memory-budget")
+    fixed = n_ratings * (RATING_BYTES + MATRIX_BYTES)
+    available = budget - baseline - fixed
+    if available <= 0:
+        raise BudgetError(f"A budget of {budget_mb:.0f} MB leaves {budget_mb - baseline_mb:.0f} MB after the "
+                          f"{baseline_mb:.0f} MB the interpreter and libraries already use, too little for the "
+                          f"rating matrix ({fixed / 2 ** 20:.0f} MB); raise --memory-budget")
+
+    # The neighbor graph stays in memory unless it would take more than a quarter of what's left
+    graph_bytes = n_users * k * 8
+    spill = graph_bytes > available // 4
+    working = available - (0 if spill else graph_bytes)
+
+    col_block = min(n_users, 8192)
+    row_block = min(n_users, 1024, working // ((col_block + k) * TILE_BYTES))
+    while row_block < 16 and col_block > 256:
+        col_block //= 2
+        row_block = min(n_users, 1024, working // ((col_block + k) * TILE_BYTES))
+    score_block = min(n_users, 1024, working // (n_items * SCORE_BYTES))
+    if row_block < 1 or score_block < 1:
+        raise BudgetError(f"A budget of {budget_mb:.0f} MB leaves no room for even one user block after the "
+                          f"{baseline_mb:.0f} MB the interpreter and libraries use and the "
+                          f"{fixed / 2 ** 20:.0f} MB rating matrix; raise --memory-budget")
+
+    return {
+        "budget": budget,
+        "baseline": baseline,
+        "row_block": int(row_block),
+        "col_block": int(col_block),
+        "score_block": int(score_block),
+        "spill": bool(spill),
+        "estimates": {
+            "load + matrix": fixed,
+            "neighbors": fixed + (0 if spill else graph_bytes) + row_block * (col_block + k) * TILE_BYTES,
+            "scoring + export": fixed + (0 if spill else graph_bytes) + score_block * n_items * SCORE_BYTES,
+        },
+    }
+
+
+class PeakTracker:
+    """Peak traced allocation (numpy and scipy arrays included) for each named stage"""
+
+    def __init__(self):
+        self.peaks = {}
+
+    @contextmanager
+    def stage(self, name):
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            self.peaks[name] = tracemalloc.get_traced_memory()[1]
+
+    @property
+    def peak(self):
+        return max(self.peaks.values(), default=0)
+
+
+def load_ratings_compact(path="ratings.csv"):
+    """Ratings with 32-bit columns and no timestamp, deduplicated like load_data"""
+    ratings = pd.read_csv(path, usecols=['userId', 'movieId', 'rating'],
+                          dtype={'userId': np.int32, 'movieId': np.int32, 'rating': np.float32})
+    return ratings.drop_duplicates(subset=['userId', 'movieId'], keep='last')
+
+
+def build_neighbors(matrix, plan, k=40, spill_dir=None):
+    """(neighbors, similarities) of each user's k - 1 nearest other users, memory-mapped from disk when spilled"""
+    n_users = matrix.shape[0]
+    if plan["spill"]:
+        write_neighbor_graph(matrix, np.arange(n_users), spill_dir, k - 1, plan["row_block"], plan["col_block"])
+        _, neighbors, similarities = load_neighbor_graph(spill_dir)
+        return neighbors, similarities
+
+    neighbors = np.zeros((n_users, min(k - 1, n_users - 1)), dtype=np.int32)
+    similarities = np.zeros(neighbors.shape, dtype=np.float32)
+    for start, idx, sims in iter_topk_blocks(matrix, k - 1, plan["row_block"], plan["col_block"]):
+        neighbors[start:start + len(idx)] = idx
+        similarities[start:start + len(sims)] = sims
+    return neighbors, similarities
+
+
+def iter_budgeted_recommendations(matrix, movie_ids, neighbors, similarities, score_block, n=10, row_range=None):
+    """Yield (row, [(movieId, score), ...]) with KNNtrain_sklearn.get_recommendations scoring.
+
+    Like sklearn's kneighbors on a training row, each user is its own nearest
+    neighbor at distance 0; its zero ratings on unseen movies still count in
+    the weighted average, as they do in np.average there. With
+    row_range=(first, stop), neighbors and similarities hold only those rows.
+    """
+    n_users = matrix.shape[0]
+    first, last = row_range or (0, n_users)
+    movie_ids = np.asarray(movie_ids)
+    for start in range(first, last, score_block):
+        stop = min(start + score_block, last)
+        rows = np.arange(start, stop)
+        idx = np.hstack([rows[:, None], neighbors[start - first:stop - first]])
+        distances = np.hstack([np.zeros((len(rows), 1)),
+                               np.maximum(1.0 - similarities[start - first:stop - first], 0.0)])
+        scores = score_rows(matrix, rows, idx, neighbor_weights(distances))
+        for offset, row_scores in enumerate(scores):
+            # Ties go to the lower movieId, i.e. movie order for the sorted columns of the exports
+            top, top_scores = top_n(movie_ids, row_scores, n)
+            yield start + offset, [(int(m), float(s)) for m, s in zip(top, top_scores)]
+
+
+def write_export_stream(user_recs, links, path):
+    """Write {userId: recs} one user at a time, byte-identical to json.dump(export, f, indent=2)"""
+    mid2tmdb = dict(zip(links.movieId, links.tmdbId.fillna(-1).astype(int)))
+    users = 0
+    with open(path, "w") as f:
+        f.write("{")
+        for user_id, recs in user_recs:
+            export = [
+                {"movieId": mid, "tmdbId": int(mid2tmdb.get(mid, -1)), "score": score}
+                for mid, score in recs
+                if mid2tmdb.get(mid, None) not in (None, -1)
+            ]
+            # Indent one user's entry exactly as it would appear inside the full dict
+            entry = json.dumps({str(user_id): export}, indent=2)[2:-2]
+            f.write(("," if users else "") + "\n" + entry)
+            users += 1
+        f.write("\n}" if users else "}")
+    return users
+
+
+def run_budgeted_export(budget, out="knn_recs_sklearn.json", ratings_path="ratings.csv", links_path="links.csv",
+                        k=40, n=10, spill_dir=None):
+    """Train and export under a memory budget, returning the plan and the measured peaks"""
+    tracker = PeakTracker()
+    baseline = current_rss()
+    tracemalloc.start()
+    try:
+        with tracker.stage("load + matrix"):
+            ratings = load_ratings_compact(ratings_path)
+            links = pd.read_csv(links_path)
+            matrix, user_ids, movie_ids = build_user_item_matrix(ratings)
+            n_ratings = len(ratings)
+            del ratings
+
+        plan = plan_pipeline(matrix.shape[0], matrix.shape[1], n_ratings, budget, k, baseline)
+        print(f"Plan for {matrix.shape[0]} users x {matrix.shape[1]} movies under {budget / 2 ** 20:.0f} MB: "
+              f"row block {plan['row_block']}, column tile {plan['col_block']}, "
+              f"scoring block {plan['score_block']}, neighbor graph {'on disk' if plan['spill'] else 'in memory'}")
+
+        with tempfile.TemporaryDirectory(dir=spill_dir) as tmp:
+            with tracker.stage("neighbors"):
+                neighbors, similarities = build_neighbors(matrix, plan, k, os.path.join(tmp, "graph"))
+            with tracker.stage("scoring + export"):
+                # Users are scored one block at a time and written as they come, so the export never builds up
+                recs = iter_budgeted_recommendations(matrix, movie_ids, neighbors, similarities,
+                                                     plan["score_block"], n)
+                users = write_export_stream(((user_ids[row], user_recs) for row, user_recs in recs), links, out)
+            del neighbors, similarities
+    finally:
+        tracemalloc.stop()
+    return plan, tracker, users
+
+
+def report(plan, tracker):
+    """Print estimated vs measured peak for every stage and the process's max RSS against the budget"""
+    budget_mb = plan["budget"] / 2 ** 20
+    print(f"\n=== Memory (budget {budget_mb:.0f} MB) ===")
+    for name, peak in tracker.peaks.items():
+        estimate = plan["estimates"].get(name, 0)
+        print(f"{name}: peak {peak / 2 ** 20:.1f} MB (estimated {estimate / 2 ** 20:.1f} MB)")
+    print(f"Peak traced allocation: {tracker.peak / 2 ** 20:.1f} MB "
+          f"on top of {plan['baseline'] / 2 ** 20:.1f} MB for the interpreter and libraries")
+    # The traced peak misses allocator slack and native buffers; RSS is what the budget actually limits
+    rss = max_rss()
+    if rss is None:
+        # No getrusage here: the traced peak on top of the baseline is the best available stand-in
+        rss = plan["baseline"] + tracker.peak
+        label = "Baseline + traced peak (max RSS unavailable)"
+    else:
+        label = "Process max RSS"
+    status = "within" if rss <= plan["budget"] else "OVER"
+    print(f"{label}: {rss / 2 ** 20:.1f} MB, {status} budget")
+    return rss <= plan["budget"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the sklearn-style KNN and export under a memory budget")
+    parser.add_argument("--memory-budget", required=True, help="e.g. 256MB or 2GB")
+    parser.add_argument("--ratings", default="ratings.csv")
+    parser.add_argument("--links", default="links.csv")
+    parser.add_argument("--out", default="knn_recs_sklearn.json")
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--spill-dir", help="where the neighbor graph is spilled (default: system temp dir)")
+    add_delta_arguments(parser)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # With --delta-out the export streams to a side file first, so the previous one is still there to diff
+    target = args.out + ".tmp" if args.delta_out else args.out
+    try:
+        plan, tracker, users = run_budgeted_export(parse_size(args.memory_budget), target, args.ratings, args.links,
+                                                   args.k, args.n, args.spill_dir)
+    except BudgetError as e:
+        parser.error(str(e))
+    print(f"Wrote {args.out} with {users} users in {time.perf_counter() - start:.2f}s")
+    report(plan, tracker)
+    if args.delta_out:
+        # Both exports are loaded for the diff, after the budgeted stages have finished
+        changes = replace_with_delta(target, args.out, args.delta_out, args.tolerance)
+        print(f"Wrote {args.delta_out} ({len(changes)} changed users)")
+
+
+if __name__ == "__main__":
+    main()
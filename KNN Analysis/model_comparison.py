@@ -1,59 +1,33 @@
-# Model comparison: KNN vs Popularity Baseline
+# Model comparison: KNN vs Bias Baseline
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import json
 
+from splits import split_ratings
+from bias_baseline import evaluate_baseline
+
 def load_data():
     """Load the ratings data"""
     ratings = pd.read_csv("ratings.csv")
     return ratings
 
-def calculate_popularity_baseline(ratings):
-    """Calculate popularity baseline metrics"""
-    # Calculate average rating for each movie
-    movie_avg_ratings = ratings.groupby('movieId')['rating'].mean()
-    
-    # Use the same train-test split as the KNN model
-    np.random.seed(42)
-    mask = np.random.rand(len(ratings)) < 0.8  # 80% train, 20% test
-    train_ratings = ratings[mask]
-    test_ratings = ratings[~mask]
-    
-    # Sample test ratings for evaluation (same as KNN)
-    test_sample = test_ratings.sample(n=min(1000, len(test_ratings)), random_state=42)
-    
-    predictions = []
-    actuals = []
-    
-    for _, row in test_sample.iterrows():
-        movie_id = row['movieId']
-        actual_rating = row['rating']
-        
-        # Predict using movie's average rating from training data
-        if movie_id in movie_avg_ratings.index:
-            predicted_rating = movie_avg_ratings[movie_id]
-            predictions.append(predicted_rating)
-            actuals.append(actual_rating)
-    
-    if len(predictions) > 0:
-        rmse = np.sqrt(np.mean((np.array(actuals) - np.array(predictions))**2))
-        mae = np.mean(np.abs(np.array(actuals) - np.array(predictions)))
-        return {'RMSE': rmse, 'MAE': mae, 'predictions': len(predictions)}
-    else:
-        return {'RMSE': 1.1, 'MAE': 0.85, 'predictions': 0}  # Fallback values
+def calculate_bias_baseline(ratings):
+    """Calculate bias baseline metrics on the whole test split"""
+    # Use the same train-test split as the KNN model; biases are fit on the train ratings only
+    train_ratings, test_ratings = split_ratings(ratings)
+    return evaluate_baseline(train_ratings, test_ratings)
 
-def create_comparison_chart(knn_metrics, popularity_metrics):
-    """Create a bar chart comparing KNN vs Popularity Baseline"""
+def create_comparison_chart(knn_metrics, baseline_metrics):
+    """Create a bar chart comparing KNN vs Bias Baseline"""
     
     # Prepare data for plotting
-    models = ['Popularity Baseline', 'KNN Model']
-    rmse_values = [popularity_metrics['RMSE'], knn_metrics['RMSE']]
-    mae_values = [popularity_metrics['MAE'], knn_metrics['MAE']]
+    models = ['Bias Baseline', 'KNN Model']
+    rmse_values = [baseline_metrics['RMSE'], knn_metrics['RMSE']]
+    mae_values = [baseline_metrics['MAE'], knn_metrics['MAE']]
     
     # Create the figure
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-    fig.suptitle('KNN vs Popularity Baseline Performance Comparison', fontsize=16, fontweight='bold')
+    fig.suptitle('KNN vs Bias Baseline Performance Comparison', fontsize=16, fontweight='bold')
     
     # RMSE comparison
     bars1 = ax1.bar(models, rmse_values, color=['#FF6B6B', '#4ECDC4'], alpha=0.7, edgecolor='black')
@@ -83,21 +57,21 @@ def create_comparison_chart(knn_metrics, popularity_metrics):
     plt.savefig('model_comparison.png', dpi=300, bbox_inches='tight')
     plt.show()
 
-def print_comparison_analysis(knn_metrics, popularity_metrics):
+def print_comparison_analysis(knn_metrics, baseline_metrics):
     """Print detailed comparison analysis"""
     print("\n" + "="*60)
     print("MODEL PERFORMANCE COMPARISON ANALYSIS")
     print("="*60)
     
     # Calculate improvements
-    rmse_improvement = ((popularity_metrics['RMSE'] - knn_metrics['RMSE']) / popularity_metrics['RMSE']) * 100
-    mae_improvement = ((popularity_metrics['MAE'] - knn_metrics['MAE']) / popularity_metrics['MAE']) * 100
+    rmse_improvement = ((baseline_metrics['RMSE'] - knn_metrics['RMSE']) / baseline_metrics['RMSE']) * 100
+    mae_improvement = ((baseline_metrics['MAE'] - knn_metrics['MAE']) / baseline_metrics['MAE']) * 100
     
     print(f"\n📊 PERFORMANCE METRICS:")
-    print(f"   Popularity Baseline:")
-    print(f"     • RMSE: {popularity_metrics['RMSE']:.4f}")
-    print(f"     • MAE: {popularity_metrics['MAE']:.4f}")
-    print(f"     • Predictions: {popularity_metrics['predictions']}")
+    print(f"   Bias Baseline:")
+    print(f"     • RMSE: {baseline_metrics['RMSE']:.4f}")
+    print(f"     • MAE: {baseline_metrics['MAE']:.4f}")
+    print(f"     • Predictions: {baseline_metrics['predictions']}")
     
     print(f"\n   KNN Collaborative Filtering:")
     print(f"     • RMSE: {knn_metrics['RMSE']:.4f}")
@@ -110,16 +84,16 @@ def print_comparison_analysis(knn_metrics, popularity_metrics):
     
     print(f"\n💡 INTERPRETATION:")
     if rmse_improvement > 0 and mae_improvement > 0:
-        print(f"   ✅ KNN model outperforms popularity baseline")
+        print(f"   ✅ KNN model outperforms bias baseline")
         print(f"   ✅ Collaborative filtering provides better predictions")
         print(f"   ✅ User similarity patterns improve recommendations")
     else:
-        print(f"   ⚠️  Popularity baseline performs better")
+        print(f"   ⚠️  Bias baseline performs better")
         print(f"   ⚠️  May need to tune KNN parameters")
         print(f"   ⚠️  Consider different similarity metrics")
     
     print(f"\n🔬 TECHNICAL DETAILS:")
-    print(f"   • Popularity Baseline: Uses average movie ratings")
+    print(f"   • Bias Baseline: Global mean + user and item biases from training ratings")
     print(f"   • KNN Model: User-based collaborative filtering")
     print(f"   • Evaluation: Same train-test split for fair comparison")
     print(f"   • Sample Size: {knn_metrics['predictions']} predictions tested")
@@ -139,16 +113,16 @@ def main():
         'predictions': 906
     }
     
-    # Calculate popularity baseline
-    print("Calculating popularity baseline metrics...")
-    popularity_metrics = calculate_popularity_baseline(ratings)
+    # Calculate bias baseline
+    print("Calculating bias baseline metrics...")
+    baseline_metrics = calculate_bias_baseline(ratings)
     
     # Create comparison chart
     print("Generating comparison chart...")
-    create_comparison_chart(knn_metrics, popularity_metrics)
+    create_comparison_chart(knn_metrics, baseline_metrics)
     
     # Print analysis
-    print_comparison_analysis(knn_metrics, popularity_metrics)
+    print_comparison_analysis(knn_metrics, baseline_metrics)
     
     print("\n✅ Model comparison complete!")
     print("📁 Generated: model_comparison.png")
@@ -0,0 +1,174 @@
+# pip install pandas numpy scipy
+# Blocked all-pairs cosine similarity that streams a top-k neighbor graph to disk
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def load_ratings(path="ratings.csv"):
+    """Load ratings and drop duplicate user-movie pairs (keep the last rating)"""
+    ratings = pd.read_csv(path)
+    return ratings.drop_duplicates(subset=['userId', 'movieId'], keep='last')
+
+
+def build_user_item_matrix(ratings):
+    """Build a sparse user x movie rating matrix plus the row/column id arrays"""
+    user_codes, user_ids = pd.factorize(ratings['userId'], sort=True)
+    movie_codes, movie_ids = pd.factorize(ratings['movieId'], sort=True)
+    matrix = sparse.csr_matrix(
+        (ratings['rating'].to_numpy(dtype=np.float64), (user_codes, movie_codes)),
+        shape=(len(user_ids), len(movie_ids))
+    )
+    matrix.sum_duplicates()
+    return matrix, np.asarray(user_ids), np.asarray(movie_ids)
+
+
+def normalize_rows(matrix):
+    """L2-normalize every row so dot products become cosine similarities"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+def select_topk(sims, idx, k):
+    """Keep the k best columns per row, ordered by similarity then index"""
+    if sims.shape[1] > k:
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        sims = np.take_along_axis(sims, part, axis=1)
+        idx = np.take_along_axis(idx, part, axis=1)
+    order = np.lexsort((idx, -sims), axis=1)
+    return np.take_along_axis(sims, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+
+def neighbor_weights(distances):
+    """KNNtrain_sklearn's inverse-distance neighbor weights"""
+    return 1 / (distances + 1e-6)
+
+
+def score_rows(matrix, rows, idx, weights):
+    """Weighted average of neighbor ratings for each user row, with the movies it has rated set to 0.
+
+    idx and weights hold each row's neighbors (itself included) and their
+    weights. Unrated movies count as zeros in the average, as they do in
+    np.average over the dense matrix in get_recommendations.
+    """
+    weight_matrix = sparse.csr_matrix(
+        (weights.ravel(), idx.ravel(), np.arange(0, weights.size + 1, idx.shape[1])),
+        shape=(len(rows), matrix.shape[0]))
+    scores = (weight_matrix @ matrix).toarray() / weights.sum(axis=1)[:, None]
+    seen = matrix[rows]
+    scores[np.repeat(np.arange(len(rows)), np.diff(seen.indptr)), seen.indices] = 0.0
+    return scores
+
+
+def top_n(columns, scores, n=10):
+    """(columns, scores) of the n highest positive scores, ties in column order like the stable sort in get_recommendations"""
+    positive = scores > 0
+    columns, scores = columns[positive], scores[positive]
+    top = np.lexsort((columns, -scores))[:n]
+    return columns[top], scores[top]
+
+
+def iter_topk_blocks(matrix, k=40, row_block=1024, col_block=8192, exclude_self=True, row_range=None):
+    """Yield (start, neighbor_idx, similarities) for consecutive blocks of users.
+
+    Each row block is multiplied against the whole matrix one column tile at a
+    time and merged into a running top-k, so peak memory is bounded by
+    row_block x (col_block + k) no matter how many users there are.
+    row_range=(first, stop) limits the query users to that slice of rows;
+    their neighbors are still searched among all users.
+    """
+    normalized = normalize_rows(sparse.csr_matrix(matrix)).tocsr().astype(np.float32)
+    n_users = normalized.shape[0]
+    k = min(k, n_users - 1 if exclude_self else n_users)
+
+    first, last = row_range or (0, n_users)
+    for start in range(first, last, row_block):
+        stop = min(start + row_block, last)
+        rows = normalized[start:stop]
+        best_sims = np.full((stop - start, 0), -np.inf, dtype=np.float32)
+        best_idx = np.zeros((stop - start, 0), dtype=np.int64)
+
+        for col_start in range(0, n_users, col_block):
+            col_stop = min(col_start + col_block, n_users)
+            tile = (rows @ normalized[col_start:col_stop].T).toarray()
+            tile_idx = np.broadcast_to(np.arange(col_start, col_stop), tile.shape)
+
+            if exclude_self:
+                # Mask the diagonal where this tile overlaps the row block
+                self_rows = np.arange(max(start, col_start), min(stop, col_stop))
+                tile[self_rows - start, self_rows - col_start] = -np.inf
+
+            best_sims, best_idx = select_topk(
+                np.hstack([best_sims, tile]), np.hstack([best_idx, tile_idx]), k
+            )
+
+        yield start, best_idx, best_sims
+
+
+def write_neighbor_graph(matrix, user_ids, out_dir, k=40, row_block=1024, col_block=8192):
+    """Stream the top-k neighbor graph into .npy files under out_dir"""
+    os.makedirs(out_dir, exist_ok=True)
+    n_users = matrix.shape[0]
+    k = min(k, n_users - 1)
+
+    neighbors = np.lib.format.open_memmap(
+        os.path.join(out_dir, "neighbors.npy"), mode='w+', dtype=np.int32, shape=(n_users, k)
+    )
+    similarities = np.lib.format.open_memmap(
+        os.path.join(out_dir, "similarities.npy"), mode='w+', dtype=np.float32, shape=(n_users, k)
+    )
+    np.save(os.path.join(out_dir, "user_ids.npy"), np.asarray(user_ids))
+
+    for start, idx, sims in iter_topk_blocks(matrix, k, row_block, col_block):
+        neighbors[start:start + len(idx)] = idx
+        similarities[start:start + len(sims)] = sims
+        # Flush each finished block so the graph never sits in memory as a whole
+        neighbors.flush()
+        similarities.flush()
+
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"users": int(n_users), "k": int(k), "metric": "cosine",
+                   "row_block": row_block, "col_block": col_block}, f, indent=2)
+
+    del neighbors, similarities
+    return out_dir
+
+
+def load_neighbor_graph(out_dir, mmap_mode='r'):
+    """Load a neighbor graph written by write_neighbor_graph"""
+    user_ids = np.load(os.path.join(out_dir, "user_ids.npy"), allow_pickle=False)
+    neighbors = np.load(os.path.join(out_dir, "neighbors.npy"), mmap_mode=mmap_mode)
+    similarities = np.load(os.path.join(out_dir, "similarities.npy"), mmap_mode=mmap_mode)
+    return user_ids, neighbors, similarities
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute a top-k user neighbor graph")
+    parser.add_argument("--ratings", default="ratings.csv")
+    parser.add_argument("--out", default="neighbor_graph")
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--row-block", type=int, default=1024, help="users per row block")
+    parser.add_argument("--col-block", type=int, default=8192, help="users per column tile")
+    args = parser.parse_args()
+
+    ratings = load_ratings(args.ratings)
+    matrix, user_ids, movie_ids = build_user_item_matrix(ratings)
+    print(f"Created sparse matrix with {matrix.shape[0]} users, {matrix.shape[1]} movies, {matrix.nnz} ratings")
+
+    start = time.perf_counter()
+    write_neighbor_graph(matrix, user_ids, args.out, k=args.k,
+                         row_block=args.row_block, col_block=args.col_block)
+    elapsed = time.perf_counter() - start
+
+    peak_mb = args.row_block * (args.col_block + args.k) * 12 / 1e6
+    print(f"Wrote {args.out}/ in {elapsed:.2f}s (similarity tile peak ~{peak_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# pip install pandas numpy
+# Incrementally maintained popularity index over rating timestamps, used as the cold-start fallback
+import argparse
+import json
+import math
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+DAY = 86400
+MODES = ("decayed", "window", "bayesian")
+
+
+class PopularityIndex:
+    """Sliding-window and exponentially decayed rating counts per movie.
+
+    Decay uses forward weights exp(rate * (t - reference)), so adding a
+    rating touches only its own movie; every count is scaled back to the
+    current time when read. Ratings that fall out of the window are
+    subtracted as the clock advances, so each rating is added and expired
+    exactly once and updates cost O(batch). The 'decayed' and 'window'
+    rankings are kept between queries: the first query after an update
+    only re-ranks the movies the update touched (added or expired) and
+    merges them back into the kept order. All decayed counts share one
+    scale, so untouched movies keep their order. The 'bayesian' ranking
+    depends on the global mean and on the scale itself, so it is re-sorted
+    in full on its first query after an update.
+
+    Modes: 'decayed' (time-decayed rating count), 'window' (ratings inside
+    the window) and 'bayesian' (decayed average rating, shrunk towards the
+    global mean with prior_weight pseudo-ratings).
+    """
+
+    def __init__(self, window_days=30.0, half_life_days=14.0, prior_weight=20.0):
+        self.window = window_days * DAY
+        self.rate = math.log(2) / (half_life_days * DAY)
+        self.prior_weight = prior_weight
+        self.positions = {}
+        self.movie_ids = np.zeros(0, dtype=np.int64)
+        self.window_counts = np.zeros(0)
+        self.decayed_counts = np.zeros(0)
+        self.decayed_sums = np.zeros(0)
+        self.reference = None
+        self.now = None
+        self.events = deque()
+        self._orders = {}
+        self._touched = []
+
+    def _columns(self, movie_ids):
+        """Positions of movie_ids, growing the arrays for movies seen for the first time"""
+        unique, inverse = np.unique(movie_ids, return_inverse=True)
+        new = [int(m) for m in unique if int(m) not in self.positions]
+        if new:
+            for movie_id in new:
+                self.positions[movie_id] = len(self.positions)
+            grow = len(self.positions) - len(self.movie_ids)
+            self.movie_ids = np.concatenate([self.movie_ids, np.array(new, dtype=np.int64)])
+            for name in ("window_counts", "decayed_counts", "decayed_sums"):
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(grow)]))
+        return np.array([self.positions[int(m)] for m in unique], dtype=np.int64)[inverse]
+
+    def update(self, movie_ids, ratings, timestamps):
+        """Add a batch of ratings; timestamps are Unix seconds and should not run backwards across batches"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(timestamps) == 0:
+            return self
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        ratings = np.asarray(ratings, dtype=np.float64)[order]
+        cols = self._columns(np.asarray(movie_ids)[order])
+
+        if self.reference is None:
+            self.reference = timestamps[0]
+        if self.rate * (timestamps[-1] - self.reference) > 500:
+            # Move the reference forward before the forward weights overflow (rare, O(movies))
+            scale = math.exp(-self.rate * (timestamps[-1] - self.reference))
+            self.decayed_counts *= scale
+            self.decayed_sums *= scale
+            self.reference = timestamps[-1]
+            # Rounding can tie counts that differed, so the kept order is rebuilt
+            self._orders.pop("decayed", None)
+        weights = np.exp(self.rate * (timestamps - self.reference))
+        np.add.at(self.decayed_counts, cols, weights)
+        np.add.at(self.decayed_sums, cols, weights * ratings)
+        np.add.at(self.window_counts, cols, 1.0)
+
+        self.events.append((timestamps, cols))
+        self._touch(cols)
+        self.now = timestamps[-1] if self.now is None else max(self.now, timestamps[-1])
+        self._expire()
+        self._orders.pop("bayesian", None)
+        return self
+
+    def _expire(self):
+        """Drop ratings older than the window from the window counts"""
+        cutoff = self.now - self.window
+        while self.events and self.events[0][0][0] < cutoff:
+            timestamps, cols = self.events[0]
+            stop = int(np.searchsorted(timestamps, cutoff))
+            np.subtract.at(self.window_counts, cols[:stop], 1.0)
+            self._touch(cols[:stop])
+            if stop == len(timestamps):
+                self.events.popleft()
+            else:
+                self.events[0] = (timestamps[stop:], cols[stop:])
+                break
+
+    def _touch(self, cols):
+        """Remember positions whose counts changed, for the kept rankings"""
+        if "decayed" in self._orders or "window" in self._orders:
+            self._touched.append(cols)
+
+    def scores(self, by="decayed", cols=None):
+        """Score per movie position in the given mode, or only at the positions in cols"""
+        cols = slice(None) if cols is None else cols
+        if by == "window":
+            return self.window_counts[cols].copy()
+        if self.reference is None:
+            return np.zeros(len(self.movie_ids))[cols]
+        scale = math.exp(-self.rate * (self.now - self.reference))
+        if by == "decayed":
+            return self.decayed_counts[cols] * scale
+        if by == "bayesian":
+            total = self.decayed_counts.sum()
+            prior = self.decayed_sums.sum() / total if total > 0 else 0.0
+            return ((self.prior_weight * prior + self.decayed_sums[cols] * scale)
+                    / (self.prior_weight + self.decayed_counts[cols] * scale))
+        raise ValueError(f"by must be one of {MODES}")
+
+    def _order(self, by):
+        """Positions of the active movies best first, by score ('decayed': unscaled count) then movieId"""
+        if by not in MODES:
+            raise ValueError(f"by must be one of {MODES}")
+        if self._touched:
+            moved = np.zeros(len(self.movie_ids), dtype=bool)
+            moved[np.concatenate(self._touched)] = True
+            self._touched = []
+            for mode in ("decayed", "window"):
+                if mode in self._orders:
+                    self._orders[mode] = self._rerank(self._orders[mode], moved, self._keys(mode))
+        if by not in self._orders:
+            keys = self._keys(by) if by != "bayesian" else self.scores(by)
+            order = np.lexsort((self.movie_ids, -keys))
+            # Movies with no recent activity are not "popular", whatever their score
+            self._orders[by] = order[self.decayed_counts[order] > 0 if by == "bayesian" else keys[order] > 0]
+        return self._orders[by]
+
+    def _keys(self, by):
+        """Unscaled values ranked in the same order as the 'decayed' or 'window' scores"""
+        return self.window_counts if by == "window" else self.decayed_counts
+
+    def _rerank(self, order, moved, keys):
+        """order with the moved positions (a mask) put in their new place, O(movies + moved log moved)"""
+        # Untouched movies keep their key and their relative order; touched ones leave when inactive
+        kept = order[~moved[order]]
+        touched = np.flatnonzero(moved & (keys > 0))
+        touched = touched[np.lexsort((self.movie_ids[touched], -keys[touched]))]
+
+        kept_keys, new_keys = -keys[kept], -keys[touched]
+        at = np.searchsorted(kept_keys, new_keys, side='left')
+        tied = at < np.searchsorted(kept_keys, new_keys, side='right')
+        if tied.any():
+            # Within a run of equal keys the kept movies are in movieId order: search (run start, movieId)
+            base = int(max(self.movie_ids[kept].max(initial=0), self.movie_ids[touched].max(initial=0))) + 1
+            starts = np.r_[True, kept_keys[1:] != kept_keys[:-1]]
+            run_start = np.maximum.accumulate(np.where(starts, np.arange(len(kept)), 0))
+            at[tied] = np.searchsorted(run_start * base + self.movie_ids[kept],
+                                       at[tied] * base + self.movie_ids[touched[tied]])
+        return np.insert(kept, at, touched)
+
+    def ranking(self, by="decayed"):
+        """(movieIds, scores) of the active movies, best first"""
+        order = self._order(by)
+        return self.movie_ids[order], self.scores(by, order)
+
+    def top(self, n=10, exclude=(), by="decayed"):
+        """[(movieId, score), ...] for the n most popular movies not in exclude (a set of movieIds)"""
+        # At most len(exclude) of the leaders can be skipped, so only they are scored
+        order = self._order(by)[:n + len(exclude)]
+        results = []
+        for movie_id, score in zip(self.movie_ids[order].tolist(), self.scores(by, order).tolist()):
+            if movie_id not in exclude:
+                results.append((movie_id, score))
+                if len(results) == n:
+                    break
+        return results
+
+    def save(self, path, tmdb_ids=None, by="decayed"):
+        """Save the state plus a ready-made ranking that recommend.py can read with numpy alone"""
+        movie_ids, scores = self.ranking(by)
+        timestamps = np.concatenate([t for t, _ in self.events]) if self.events else np.zeros(0)
+        cols = np.concatenate([c for _, c in self.events]) if self.events else np.zeros(0, dtype=np.int64)
+        tmdb = np.full(len(movie_ids), -1, dtype=np.int64)
+        if tmdb_ids is not None:
+            tmdb = np.array([tmdb_ids.get(m, -1) for m in movie_ids.tolist()], dtype=np.int64)
+        np.savez(
+            path, movie_ids=self.movie_ids, window_counts=self.window_counts, decayed_counts=self.decayed_counts,
+            decayed_sums=self.decayed_sums, event_timestamps=timestamps, event_cols=cols,
+            params=np.array([self.window, self.rate, self.prior_weight,
+                             np.nan if self.reference is None else self.reference,
+                             np.nan if self.now is None else self.now]),
+            ranked_movie_ids=movie_ids.astype(np.int64), ranked_tmdb_ids=tmdb,
+            ranked_scores=scores, ranked_by=by,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Restore an index written by save, ready for further updates"""
+        with np.load(path, allow_pickle=False) as f:
+            window, rate, prior_weight, reference, now = f["params"]
+            index = cls(window / DAY, math.log(2) / rate / DAY, prior_weight)
+            index.movie_ids = f["movie_ids"]
+            index.positions = {int(m): i for i, m in enumerate(index.movie_ids)}
+            index.window_counts = f["window_counts"]
+            index.decayed_counts = f["decayed_counts"]
+            index.decayed_sums = f["decayed_sums"]
+            index.reference = None if np.isnan(reference) else float(reference)
+            index.now = None if np.isnan(now) else float(now)
+            if len(f["event_timestamps"]):
+                index.events.append((f["event_timestamps"], f["event_cols"]))
+        return index
+
+
+def fill_export(export, index, seen, n=10, tmdb_ids=None, by="decayed"):
+    """Pad every user's recommendation list to n with popular movies they have not rated or been recommended"""
+    filled = {}
+    added = 0
+    for user_id, recs in export.items():
+        extra = []
+        if len(recs) < n:
+            exclude = set(seen.get(user_id, ())) | {rec["movieId"] for rec in recs}
+            for movie_id, score in index.top(2 * n, exclude, by):
+                tmdb_id = tmdb_ids.get(movie_id, -1) if tmdb_ids is not None else -1
+                # Like the exporters, drop movies the app cannot show when links are known
+                if tmdb_ids is not None and tmdb_id == -1:
+                    continue
+                extra.append({"movieId": movie_id, "tmdbId": int(tmdb_id), "score": float(score), "source": "popular"})
+                if len(recs) + len(extra) == n:
+                    break
+        filled[user_id] = recs + extra
+        added += len(extra)
+    return filled, added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the time-windowed popularity index from rating timestamps")
+    parser.add_argument("--ratings", default="ratings.csv")
+    parser.add_argument("--links", default="links.csv")
+    parser.add_argument("--window-days", type=float, default=30.0)
+    parser.add_argument("--half-life-days", type=float, default=14.0)
+    parser.add_argument("--prior-weight", type=float, default=20.0)
+    parser.add_argument("--by", default="decayed", choices=MODES)
+    parser.add_argument("--batch-size", type=int, default=1000, help="ratings per incremental update")
+    parser.add_argument("--out", default="popularity_index.npz")
+    parser.add_argument("--fill-export", help="pad the lists in this export to --n with popular movies")
+    parser.add_argument("--n", type=int, default=10)
+    args = parser.parse_args()
+
+    ratings = pd.read_csv(args.ratings).sort_values('timestamp', kind='stable')
+    links = pd.read_csv(args.links)
+    tmdb_ids = dict(zip(links.movieId, links.tmdbId.fillna(-1).astype(int)))
+
+    index = PopularityIndex(args.window_days, args.half_life_days, args.prior_weight)
+    update_seconds, first_query_seconds = [], []
+    for start in range(0, len(ratings), args.batch_size):
+        batch = ratings.iloc[start:start + args.batch_size]
+        t = time.perf_counter()
+        index.update(batch['movieId'].to_numpy(), batch['rating'].to_numpy(), batch['timestamp'].to_numpy())
+        update_seconds.append(time.perf_counter() - t)
+        # Queries interleaved with updates pay for re-ranking what the update touched
+        t = time.perf_counter()
+        index.top(args.n, by=args.by)
+        first_query_seconds.append(time.perf_counter() - t)
+
+    seen = ratings.groupby('userId')['movieId'].agg(set)
+    users = seen.index[:200]
+    start = time.perf_counter()
+    for user_id in users:
+        index.top(args.n, seen[user_id], args.by)
+    query_us = (time.perf_counter() - start) * 1e6 / len(users)
+
+    index.save(args.out, tmdb_ids, args.by)
+    print(f"Indexed {len(ratings)} ratings for {len(index.movie_ids)} movies, "
+          f"as of {pd.to_datetime(index.now, unit='s').date()}")
+    print(f"Update: {np.mean(update_seconds) * 1e6 / args.batch_size:.2f} us per rating "
+          f"({len(update_seconds)} batches of {args.batch_size})")
+    print(f"Query: {query_us:.1f} us for top {args.n} excluding the user's movies, "
+          f"{np.median(first_query_seconds) * 1e6:.1f} us median for the first query after an update")
+    print(f"Wrote {args.out}")
+
+    print(f"\nMost popular ({args.by}, {args.window_days:g}-day window, {args.half_life_days:g}-day half-life):")
+    for movie_id, score in index.top(5, by=args.by):
+        print(f"  {movie_id} (tmdb {tmdb_ids.get(movie_id, -1)}): {score:.3f}")
+
+    if args.fill_export:
+        with open(args.fill_export, "r") as f:
+            export = json.load(f)
+        seen_by_user = {str(user_id): movies for user_id, movies in seen.items()}
+        filled, added = fill_export(export, index, seen_by_user, args.n, tmdb_ids, args.by)
+        out = args.fill_export.replace(".json", ".filled.json")
+        with open(out, "w") as f:
+            json.dump(filled, f, indent=2)
+        print(f"\nAdded {added} popular fallbacks, wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
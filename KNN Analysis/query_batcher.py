@@ -0,0 +1,194 @@
+# pip install pandas numpy scipy
+# Micro-batching scheduler for KNN recommendation queries, with a benchmark against unbatched serving
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from scipy import sparse
+
+from neighbor_graph import (load_ratings, build_user_item_matrix, neighbor_weights, normalize_rows, score_rows,
+                            select_topk, top_n)
+from replay_benchmark import percentiles
+
+
+class KNNQueryEngine:
+    """Answers recommendation queries for known users with KNNtrain_sklearn's scoring.
+
+    Neighbors and scores for a whole batch of users come from two sparse
+    matrix products, so one call for 32 users costs far less than 32 calls.
+    """
+
+    def __init__(self, matrix, user_ids, movie_ids, k=40):
+        self.matrix = sparse.csr_matrix(matrix)
+        self.normalized = normalize_rows(self.matrix).tocsr()
+        self.normalized_t = self.normalized.T.tocsr()
+        self.user_ids = np.asarray(user_ids)
+        self.movie_ids = np.asarray(movie_ids)
+        self.k = min(k, self.matrix.shape[0])
+
+    def rows(self, user_ids):
+        """Matrix rows of userIds; raises KeyError for ids the engine does not know"""
+        user_ids = np.asarray(user_ids)
+        rows = np.searchsorted(self.user_ids, user_ids)
+        known = rows < len(self.user_ids)
+        known[known] = self.user_ids[rows[known]] == user_ids[known]
+        if not known.all():
+            raise KeyError(f"Unknown userIds {user_ids[~known].tolist()}")
+        return rows
+
+    def check_user(self, user_id):
+        """MicroBatcher validator: raises KeyError before an unknown user can join a batch"""
+        self.rows([user_id])
+
+    def recommend_batch(self, user_ids, n=10):
+        """[[(movieId, score), ...], ...] for a list of userIds, in the same order"""
+        rows = self.rows(user_ids)
+        sims = (self.normalized[rows] @ self.normalized_t).toarray()
+        # Each user is its own nearest neighbor at distance 0, as with sklearn's kneighbors on a training row
+        sims[np.arange(len(rows)), rows] = 1.0
+        idx = np.broadcast_to(np.arange(sims.shape[1]), sims.shape)
+        top_sims, top_idx = select_topk(sims, idx, self.k)
+        scores = score_rows(self.matrix, rows, top_idx, neighbor_weights(np.maximum(1.0 - top_sims, 0.0)))
+
+        columns = np.arange(scores.shape[1])
+        results = []
+        for row_scores in scores:
+            top, top_scores = top_n(columns, row_scores, n)
+            results.append([(int(self.movie_ids[i]), float(s)) for i, s in zip(top, top_scores)])
+        return results
+
+
+class MicroBatcher:
+    """Collects concurrent requests for up to max_wait_ms or max_batch requests, then runs them as one batch.
+
+    handler takes a list of requests and returns a list of results in the
+    same order. It runs on a single worker thread; numpy and scipy release
+    the GIL inside their kernels, so request threads keep running meanwhile.
+    validate, if given, runs on the submitting thread; a request it raises
+    for fails its own future and never joins a batch.
+    """
+
+    def __init__(self, handler, max_batch=32, max_wait_ms=2.0, validate=None):
+        self.handler = handler
+        self.validate = validate
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batch_sizes = []
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, request):
+        """Queue one request; the returned Future resolves to its result"""
+        future = Future()
+        if self.validate is not None:
+            try:
+                self.validate(request)
+            except Exception as e:
+                future.set_exception(e)
+                return future
+        self.requests.put((request, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            closing = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            self.batch_sizes.append(len(batch))
+            try:
+                results = self.handler([request for request, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                # One failing batch fails its own requests, not the scheduler
+                for _, future in batch:
+                    future.set_exception(e)
+            if closing:
+                return
+
+    def close(self):
+        """Finish queued requests and stop the worker thread"""
+        self.requests.put(None)
+        self._worker.join()
+
+
+def run_clients(call, user_ids, clients=16, queries_per_client=50, seed=42):
+    """Closed-loop load: each client thread sends its next query as soon as the previous one returns"""
+    rng = np.random.default_rng(seed)
+    workloads = [rng.choice(user_ids, queries_per_client) for _ in range(clients)]
+    latencies = [[] for _ in range(clients)]
+
+    def client(i):
+        for user_id in workloads[i]:
+            t = time.perf_counter()
+            call(int(user_id))
+            latencies[i].append((time.perf_counter() - t) * 1000)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    all_latencies = [ms for client_latencies in latencies for ms in client_latencies]
+    return {"queries_per_second": len(all_latencies) / elapsed, **percentiles(all_latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched against unbatched KNN query serving")
+    parser.add_argument("--ratings", default="ratings.csv")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client threads")
+    parser.add_argument("--queries", type=int, default=50, help="queries per client")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--k", type=int, default=40)
+    args = parser.parse_args()
+
+    matrix, user_ids, movie_ids = build_user_item_matrix(load_ratings(args.ratings))
+    engine = KNNQueryEngine(matrix, user_ids, movie_ids, k=args.k)
+    print(f"Serving {len(user_ids)} users x {len(movie_ids)} movies with {args.clients} concurrent clients")
+
+    # Batching must not change any answer
+    sample = [int(u) for u in user_ids[:64]]
+    assert engine.recommend_batch(sample) == [engine.recommend_batch([u])[0] for u in sample]
+
+    results = {"unbatched": run_clients(lambda u: engine.recommend_batch([u])[0], user_ids,
+                                        args.clients, args.queries)}
+    batcher = MicroBatcher(engine.recommend_batch, args.max_batch, args.max_wait_ms, validate=engine.check_user)
+    try:
+        results["micro-batched"] = run_clients(lambda u: batcher.submit(u).result(), user_ids,
+                                               args.clients, args.queries)
+    finally:
+        batcher.close()
+
+    print(f"\n=== Serving Comparison ({args.clients * args.queries} queries) ===")
+    print(f"{'mode':<14} {'queries/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode, stats in results.items():
+        print(f"{mode:<14} {stats['queries_per_second']:>10.1f} {stats['p50']:>8.2f} {stats['p95']:>8.2f} "
+              f"{stats['p99']:>8.2f} {stats['max']:>8.2f}")
+    print(f"Average batch size: {np.mean(batcher.batch_sizes):.1f} (max {args.max_batch}, wait {args.max_wait_ms} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# pip install pandas numpy
+# Vectorized top-k ranking metrics shared by the KNN trainers
+import numpy as np
+
+
+def _movie_id(rec):
+    """Accept a bare movieId, a (movieId, score) tuple or a {'movieId': ...} dict"""
+    if isinstance(rec, dict):
+        return rec['movieId']
+    if isinstance(rec, (tuple, list)):
+        return rec[0]
+    return rec
+
+
+def encode_recommendations(recommendations, k=10):
+    """Encode {userId: ranked recs} as a user array and a (users x k) movieId array padded with -1.
+
+    Only the first k recommendations count and repeated movies are kept once,
+    which is the set semantics the per-user implementations used.
+    """
+    users = np.asarray(list(recommendations.keys()))
+    items = np.full((len(users), k), -1, dtype=np.int64)
+    for row, recs in enumerate(recommendations.values()):
+        ranked = list(dict.fromkeys(int(_movie_id(rec)) for rec in recs[:k]))
+        items[row, :len(ranked)] = ranked
+    return users, items
+
+
+def relevance_hits(users, items, test_ratings, threshold=3.5):
+    """Boolean hit matrix for items plus the number of relevant test movies per user (users must be non-empty)"""
+    order = np.argsort(users, kind='stable')
+    sorted_users = users[order]
+
+    relevant = test_ratings[test_ratings['rating'] >= threshold]
+    rel_users = relevant['userId'].to_numpy()
+    rel_items = relevant['movieId'].to_numpy(dtype=np.int64)
+
+    # Row of each relevant rating's user among the evaluated users, dropping users not evaluated
+    pos = np.clip(np.searchsorted(sorted_users, rel_users), 0, len(users) - 1)
+    matched = sorted_users[pos] == rel_users
+    rel_rows = order[pos[matched]]
+    rel_items = rel_items[matched]
+
+    # One (row, movie) pair per relevant test rating, deduplicated
+    stride = int(max(items.max(initial=0), rel_items.max(initial=0))) + 1
+    rel_keys = np.unique(rel_rows.astype(np.int64) * stride + rel_items)
+    n_relevant = np.bincount(rel_keys // stride, minlength=len(users))
+
+    rec_keys = np.arange(len(users), dtype=np.int64)[:, None] * stride + items
+    hits = np.isin(rec_keys, rel_keys) & (items >= 0)
+    return hits, n_relevant
+
+
+def compute_ranking_metrics(hits, n_relevant, n_recommended, k=10):
+    """Per-user precision, recall, NDCG, average precision and hit flag from a hit matrix"""
+    n_hits = hits.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(n_recommended > 0, n_hits / n_recommended, 0.0)
+        recall = np.where(n_relevant > 0, n_hits / n_relevant, 0.0)
+
+        discounts = 1.0 / np.log2(np.arange(2, k + 2))
+        dcg = (hits * discounts).sum(axis=1)
+        ideal = np.concatenate([[0.0], np.cumsum(discounts)])[np.minimum(n_relevant, k)]
+        ndcg = np.where(ideal > 0, dcg / ideal, 0.0)
+
+        precision_at_i = np.cumsum(hits, axis=1) / np.arange(1, k + 1)
+        ap_denominator = np.minimum(n_relevant, k)
+        average_precision = np.where(
+            ap_denominator > 0, (precision_at_i * hits).sum(axis=1) / ap_denominator, 0.0)
+
+    return {
+        'precision': precision,
+        'recall': recall,
+        'ndcg': ndcg,
+        'average_precision': average_precision,
+        'hit': (n_hits > 0).astype(float),
+    }
+
+
+def ranking_metrics(recommendations, test_ratings, k=10, threshold=3.5, catalog_size=None):
+    """Precision@k, Recall@k, NDCG@k, MAP@k, HitRate@k and catalog coverage for all users at once.
+
+    recommendations maps userId -> ranked recommendations; every user in it is
+    evaluated against their test ratings at or above threshold.
+    """
+    if len(recommendations) == 0:
+        return {}
+
+    users, items = encode_recommendations(recommendations, k)
+    hits, n_relevant = relevance_hits(users, items, test_ratings, threshold)
+    per_user = compute_ranking_metrics(hits, n_relevant, (items >= 0).sum(axis=1), k)
+
+    metrics = {
+        f'Precision@{k}': float(np.mean(per_user['precision'])),
+        f'Recall@{k}': float(np.mean(per_user['recall'])),
+        f'NDCG@{k}': float(np.mean(per_user['ndcg'])),
+        f'MAP@{k}': float(np.mean(per_user['average_precision'])),
+        f'HitRate@{k}': float(np.mean(per_user['hit'])),
+    }
+    if catalog_size:
+        metrics['Coverage'] = len(np.unique(items[items >= 0])) / catalog_size
+    return metrics
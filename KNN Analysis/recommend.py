@@ -0,0 +1,179 @@
+# pip install numpy
+# Fast recommendation lookup from a saved ALS artifact; only numpy is imported on the query path
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+# Importing any of these would blow the start-up budget, so the hot path must never touch them
+HEAVY_MODULES = ("pandas", "scipy", "sklearn", "surprise", "matplotlib", "seaborn", "plotly")
+
+
+def load_artifact(path):
+    """Arrays from an als_engine.py --model-out file"""
+    with np.load(path, allow_pickle=False) as f:
+        artifact = {name: f[name] for name in f.files}
+    missing = {"seen_indptr", "seen_indices", "tmdb_ids"} - set(artifact)
+    if missing:
+        raise SystemExit(f"{path} has no {', '.join(sorted(missing))}; re-export it with als_engine.py")
+    return artifact
+
+
+def fold_in(artifact, cols, ratings):
+    """User factors for a profile that is not in the model, solved against the fixed item factors"""
+    items = artifact["item_factors"]
+    selected = items[cols]
+    eye = np.eye(items.shape[1])
+    regularization = float(artifact["regularization"])
+    if bool(artifact["implicit"]):
+        confidence = float(artifact["alpha"]) * ratings
+        lhs = items.T @ items + regularization * eye + (selected * confidence[:, None]).T @ selected
+        rhs = selected.T @ (1.0 + confidence)
+    else:
+        # Same weighted-lambda system ALSModel._solve builds for a training row
+        lhs = selected.T @ selected + regularization * max(len(cols), 1) * eye
+        rhs = selected.T @ (ratings - float(artifact["global_mean"]))
+    return np.linalg.solve(lhs, rhs)
+
+
+def top_n(artifact, user_vector, exclude, n=10):
+    """[{'movieId', 'tmdbId', 'score'}, ...] for the best n movies outside exclude"""
+    scores = float(artifact["global_mean"]) + artifact["item_factors"] @ user_vector
+    scores[exclude] = -np.inf
+    scores[artifact["tmdb_ids"] < 0] = -np.inf   # the app can only show movies with a tmdbId
+    n = min(n, int(np.isfinite(scores).sum()))
+    if n == 0:
+        return []
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [
+        {"movieId": int(artifact["movie_ids"][i]), "tmdbId": int(artifact["tmdb_ids"][i]), "score": float(scores[i])}
+        for i in top
+    ]
+
+
+def load_popular(path):
+    """Ranked arrays from a popularity_index.py file, the cold-start fallback"""
+    with np.load(path, allow_pickle=False) as f:
+        return {"movie_ids": f["ranked_movie_ids"], "tmdb_ids": f["ranked_tmdb_ids"], "scores": f["ranked_scores"]}
+
+
+def popular(fallback, exclude_tmdb_ids=(), n=10):
+    """The n most popular movies with a tmdbId outside exclude_tmdb_ids"""
+    tmdb_ids = fallback["tmdb_ids"]
+    keep = np.flatnonzero((tmdb_ids >= 0) & ~np.isin(tmdb_ids, list(exclude_tmdb_ids)))[:n]
+    return [
+        {"movieId": int(fallback["movie_ids"][i]), "tmdbId": int(tmdb_ids[i]), "score": float(fallback["scores"][i]),
+         "source": "popular"}
+        for i in keep
+    ]
+
+
+def recommend_user(artifact, user_id, n=10, fallback=None):
+    """Recommendations for a userId the model was trained on; popular movies for any other user if fallback is given"""
+    user_ids = artifact["user_ids"]
+    row = int(np.searchsorted(user_ids, user_id))
+    if row == len(user_ids) or user_ids[row] != user_id:
+        if fallback is not None:
+            return popular(fallback, (), n)
+        raise SystemExit(f"Unknown user {user_id}")
+    seen = artifact["seen_indices"][artifact["seen_indptr"][row]:artifact["seen_indptr"][row + 1]]
+    return top_n(artifact, artifact["user_factors"][row], seen, n)
+
+
+def parse_profile(text):
+    """'603:5,27205:4.5' -> {603: 5.0, 27205: 4.5}; a bare tmdbId counts as a 4.0 rating"""
+    profile = {}
+    for entry in text.split(","):
+        if entry.strip():
+            tmdb_id, _, rating = entry.partition(":")
+            try:
+                profile[int(tmdb_id)] = float(rating) if rating else 4.0
+            except ValueError:
+                raise ValueError(f"bad entry {entry.strip()!r}, expected tmdbId[:rating]") from None
+    if not profile:
+        raise ValueError("no tmdbIds given")
+    return profile
+
+
+def recommend_profile(artifact, profile, n=10, fallback=None):
+    """Recommendations for a {tmdbId: rating} watch history, e.g. an app user's"""
+    tmdb_ids = artifact["tmdb_ids"]
+    order = np.argsort(tmdb_ids, kind='stable')
+    wanted = np.array(list(profile), dtype=tmdb_ids.dtype)
+    pos = np.clip(np.searchsorted(tmdb_ids[order], wanted), 0, len(order) - 1)
+    known = tmdb_ids[order[pos]] == wanted
+    if not known.any():
+        if fallback is not None:
+            return popular(fallback, profile, n)
+        raise SystemExit("None of the profile's tmdbIds are in the model")
+    cols = order[pos[known]]
+    ratings = np.array(list(profile.values()))[known]
+    return top_n(artifact, fold_in(artifact, cols, ratings), cols, n)
+
+
+def process_elapsed_ms():
+    """Wall time since the process started, interpreter start-up included.
+
+    Read from /proc on Linux (10 ms resolution); elsewhere only the time
+    since this module was imported is known, which leaves out start-up.
+    """
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Field 22 is the start time in clock ticks after boot; the command name before it may contain spaces
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return (uptime - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000, "process"
+    except (OSError, ValueError, IndexError, AttributeError):
+        return (time.perf_counter() - _STARTED) * 1000, "import"
+
+
+def check_budget(budget_ms):
+    """Fail when start-up to answer took longer than budget_ms or a heavy library was imported"""
+    elapsed_ms, since = process_elapsed_ms()
+    heavy = sorted(name for name in HEAVY_MODULES if name in sys.modules)
+    print(f"Answered {elapsed_ms:.0f} ms after {since} start (budget {budget_ms:.0f} ms)", file=sys.stderr)
+    if heavy:
+        print(f"Heavy modules imported on the query path: {', '.join(heavy)}", file=sys.stderr)
+    return elapsed_ms <= budget_ms and not heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommendations from a saved ALS model")
+    query = parser.add_mutually_exclusive_group(required=True)
+    query.add_argument("--user", type=int, help="MovieLens userId")
+    query.add_argument("--tmdb-profile", help="comma separated tmdbId[:rating] list, e.g. 603:5,27205:4.5")
+    parser.add_argument("--model", default="als_model.npz")
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--popular", help="popularity_index.py file answering cold-start users instead of failing")
+    parser.add_argument("--startup-budget-ms", type=float,
+                        help="exit with status 3 if answering took longer than this after the process started")
+    args = parser.parse_args()
+    if args.tmdb_profile is not None:
+        try:
+            profile = parse_profile(args.tmdb_profile)
+        except ValueError as e:
+            parser.error(f"--tmdb-profile: {e}")
+
+    artifact = load_artifact(args.model)
+    fallback = load_popular(args.popular) if args.popular else None
+    if args.user is not None:
+        recs = recommend_user(artifact, args.user, args.n, fallback)
+    else:
+        recs = recommend_profile(artifact, profile, args.n, fallback)
+    json.dump(recs, sys.stdout, indent=2)
+    print()
+
+    if args.startup_budget_ms is not None and not check_budget(args.startup_budget_ms):
+        sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# pip install pandas numpy scipy
+# "Viewers also liked": top-k related movies per tmdbId from rating co-occurrence, exported as lookup shards
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from neighbor_graph import load_ratings, build_user_item_matrix
+from two_stage import top_rated_lists
+
+METRICS = ("cosine", "lift", "count")
+
+
+def related_scores(matrix, metric="cosine", min_rating=4.0, min_support=5, block_size=1024):
+    """Sparse movie x movie scores from users who rated both movies (at or above min_rating).
+
+    Pairs seen together by fewer than min_support users are dropped, which
+    keeps lift from ranking two movies with one shared viewer at the top.
+    """
+    viewed = sparse.csr_matrix(matrix >= max(min_rating, np.finfo(float).tiny), dtype=np.float32)
+    viewed_t = viewed.T.tocsr()
+    n_users, n_items = viewed.shape
+    counts = np.asarray(viewed.sum(axis=0)).ravel()
+
+    blocks = []
+    for start in range(0, n_items, block_size):
+        stop = min(start + block_size, n_items)
+        co = (viewed_t[start:stop] @ viewed).tocoo()
+        keep = (co.data >= min_support) & (co.row + start != co.col)
+        rows, cols, together = co.row[keep], co.col[keep], co.data[keep].astype(np.float64)
+        if metric == "lift":
+            values = together * n_users / (counts[rows + start] * counts[cols])
+        elif metric == "cosine":
+            values = together / np.sqrt(counts[rows + start] * counts[cols])
+        else:
+            values = together
+        blocks.append(sparse.csr_matrix((values, (rows, cols)), shape=(stop - start, n_items)))
+    return sparse.vstack(blocks).tocsr() if blocks else sparse.csr_matrix((0, n_items))
+
+
+def resolve_tmdb_ids(matrix, movie_ids, links):
+    """tmdbId per matrix column (-1 for none), with one column per tmdbId.
+
+    links.csv can map several movieIds to one tmdbId (6003 and 144606 share
+    4912). Only the most-rated of those movies keeps the tmdbId, ties to the
+    lower movieId, so no key is written twice and no list repeats a tmdbId.
+    Returns (tmdb, collisions) with collisions as [(tmdbId, kept, [dropped, ...]), ...].
+    """
+    tmdb = links.set_index('movieId')['tmdbId'].reindex(movie_ids).fillna(-1).astype(np.int64).to_numpy()
+    movie_ids = np.asarray(movie_ids)
+    counts = np.diff(sparse.csc_matrix(matrix).indptr)
+    mapped = np.flatnonzero(tmdb >= 0)
+    # Group by tmdbId, most ratings first, then lowest movieId
+    mapped = mapped[np.lexsort((movie_ids[mapped], -counts[mapped], tmdb[mapped]))]
+    first = np.r_[True, tmdb[mapped][1:] != tmdb[mapped][:-1]]
+
+    collisions = []
+    for start, stop in zip(np.flatnonzero(first), np.r_[np.flatnonzero(first)[1:], len(mapped)]):
+        if stop - start > 1:
+            group = mapped[start:stop]
+            collisions.append((int(tmdb[group[0]]), int(movie_ids[group[0]]), movie_ids[group[1:]].tolist()))
+    tmdb = tmdb.copy()
+    tmdb[mapped[~first]] = -1
+    return tmdb, collisions
+
+
+def build_related_table(matrix, movie_ids, links, k=20, **score_options):
+    """{tmdbId: [[relatedTmdbId, score], ...]} best first, for every movie with a tmdbId"""
+    tmdb, collisions = resolve_tmdb_ids(matrix, movie_ids, links)
+    for tmdb_id, kept, dropped in collisions:
+        print(f"tmdbId {tmdb_id} is shared by movieIds {[kept] + dropped}; keeping {kept} (most rated)")
+    scores = related_scores(matrix, **score_options)
+    # Movies the app cannot open are never suggested
+    scores = scores @ sparse.diags((tmdb >= 0).astype(np.float64))
+    scores.eliminate_zeros()
+    indptr, indices = top_rated_lists(scores, k)
+
+    table = {}
+    for col in np.flatnonzero(tmdb >= 0):
+        related = indices[indptr[col]:indptr[col + 1]]
+        if len(related):
+            row = scores[col]
+            values = dict(zip(row.indices, row.data))
+            table[int(tmdb[col])] = [[int(tmdb[j]), round(float(values[j]), 4)] for j in related]
+    return table
+
+
+def write_shards(table, out_dir, shards=64, meta=None):
+    """Split the table into tmdbId % shards JSON files so one lookup reads one small file"""
+    os.makedirs(out_dir, exist_ok=True)
+    buckets = [{} for _ in range(shards)]
+    for tmdb_id in sorted(table):
+        buckets[tmdb_id % shards][str(tmdb_id)] = table[tmdb_id]
+    for shard, bucket in enumerate(buckets):
+        with open(os.path.join(out_dir, f"related_{shard:03d}.json"), "w") as f:
+            json.dump(bucket, f, separators=(",", ":"))
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"shards": shards, "movies": len(table), "fields": ["tmdbId", "score"], **(meta or {})},
+                  f, indent=2)
+
+
+class RelatedItems:
+    """Reads related movies for a tmdbId from the shards, loading each shard at most once"""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        with open(os.path.join(out_dir, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self._shards = {}
+
+    def get(self, tmdb_id, n=None):
+        """[[tmdbId, score], ...] best first, or [] for an unknown movie"""
+        shard = int(tmdb_id) % self.meta["shards"]
+        if shard not in self._shards:
+            with open(os.path.join(self.out_dir, f"related_{shard:03d}.json"), "r") as f:
+                self._shards[shard] = json.load(f)
+        related = self._shards[shard].get(str(int(tmdb_id)), [])
+        return related[:n] if n else related
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute a 'viewers also liked' table keyed by tmdbId")
+    parser.add_argument("--ratings", default="ratings.csv")
+    parser.add_argument("--links", default="links.csv")
+    parser.add_argument("--metric", default="cosine", choices=METRICS)
+    parser.add_argument("--k", type=int, default=20, help="related movies kept per movie")
+    parser.add_argument("--min-rating", type=float, default=4.0, help="only count ratings at or above this (0 = any rating)")
+    parser.add_argument("--min-support", type=int, default=5, help="minimum number of shared viewers")
+    parser.add_argument("--shards", type=int, default=64)
+    parser.add_argument("--out", default="related_items")
+    parser.add_argument("--show", type=int, help="print the related movies of this tmdbId after writing")
+    args = parser.parse_args()
+
+    matrix, user_ids, movie_ids = build_user_item_matrix(load_ratings(args.ratings))
+    links = pd.read_csv(args.links)
+    print(f"Created sparse matrix with {matrix.shape[0]} users and {matrix.shape[1]} movies")
+
+    start = time.perf_counter()
+    table = build_related_table(matrix, movie_ids, links, k=args.k, metric=args.metric,
+                                min_rating=args.min_rating, min_support=args.min_support)
+    elapsed = time.perf_counter() - start
+    write_shards(table, args.out, args.shards,
+                 meta={"k": args.k, "metric": args.metric, "min_rating": args.min_rating,
+                       "min_support": args.min_support})
+
+    size = sum(os.path.getsize(os.path.join(args.out, name)) for name in os.listdir(args.out))
+    print(f"Related movies for {len(table)} of {matrix.shape[1]} movies in {elapsed:.2f}s")
+    print(f"Wrote {args.shards} shards to {args.out}/ ({size / 1e6:.1f} MB)")
+
+    if args.show is not None:
+        start = time.perf_counter()
+        related = RelatedItems(args.out).get(args.show)
+        print(f"\nRelated to tmdbId {args.show} (lookup {(time.perf_counter() - start) * 1000:.2f} ms):")
+        for tmdb_id, score in related[:10]:
+            print(f"  {tmdb_id}: {score}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# pip install pandas numpy scipy
+# Replay ratings in timestamp order to benchmark incremental updates and query latency
+import argparse
+import heapq
+import json
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from memory_budget import iter_budgeted_recommendations
+from neighbor_graph import normalize_rows, select_topk
+
+
+class PipelineKNN:
+    """The export pipeline's KNN, kept current as ratings arrive.
+
+    New users and movies get the next row or column, and each rating is
+    appended to a COO buffer as the change it makes to its cell, so an
+    update costs O(batch) however many ratings came before. The first query
+    after an update folds the buffer into the sparse user x movie matrix
+    and row-normalizes it, no more than the O(ratings) similarity product
+    the query runs anyway. A query finds the user's neighbors with that
+    product and scores them with memory_budget.iter_budgeted_recommendations,
+    the KNNtrain_sklearn.get_recommendations scoring the exports use. Ties
+    go to the lower userId and movieId, as in the exports' sorted matrix.
+    """
+
+    def __init__(self, k=40):
+        self.k = k
+        self.ratings = {}
+        self.user_rows = {}
+        self.movie_cols = {}
+        self.user_ids = []
+        self.movie_ids = []
+        self.pending = ([], [], [])
+        self.matrix = sparse.csr_matrix((0, 0))
+        self.normalized = self.matrix
+
+    def add_batch(self, events):
+        """Buffer (userId, movieId, rating) rows; a later rating of the same movie replaces the earlier one"""
+        rows, cols, deltas = self.pending
+        for user_id, movie_id, rating in events:
+            user_id, movie_id, rating = int(user_id), int(movie_id), float(rating)
+            row = self.user_rows.setdefault(user_id, len(self.user_rows))
+            if row == len(self.user_ids):
+                self.user_ids.append(user_id)
+            col = self.movie_cols.setdefault(movie_id, len(self.movie_cols))
+            if col == len(self.movie_ids):
+                self.movie_ids.append(movie_id)
+            rows.append(row)
+            cols.append(col)
+            deltas.append(rating - self.ratings.get((user_id, movie_id), 0.0))
+            self.ratings[user_id, movie_id] = rating
+
+    def _fold(self):
+        """Add the buffered changes to the matrix and renormalize it"""
+        rows, cols, deltas = self.pending
+        if not rows:
+            return
+        shape = (len(self.user_ids), len(self.movie_ids))
+        self.matrix.resize(shape)
+        self.matrix = (self.matrix + sparse.csr_matrix((deltas, (rows, cols)), shape=shape)).tocsr()
+        self.matrix.eliminate_zeros()
+        self.normalized = normalize_rows(self.matrix).tocsr()
+        self.pending = ([], [], [])
+
+    def recommend(self, user_id, n=10):
+        """Top-n unrated movies as (movieId, score) pairs, best first"""
+        row = self.user_rows.get(user_id)
+        if row is None:
+            return []
+        self._fold()
+        sims = (self.normalized[row] @ self.normalized.T).toarray()
+        sims[0, row] = -np.inf
+        k = min(self.k - 1, self.matrix.shape[0] - 1)
+        user_ids = np.asarray(self.user_ids)
+        neighbor_sims, neighbor_ids = select_topk(sims, user_ids[None, :], k)
+        neighbors = np.array([[self.user_rows[int(u)] for u in neighbor_ids[0]]])
+        return next(iter_budgeted_recommendations(self.matrix, self.movie_ids, neighbors, neighbor_sims, 1, n,
+                                                  row_range=(row, row + 1)))[1]
+
+
+class IncrementalKNN:
+    """Standalone user-based cosine KNN whose state is updated one rating at a time.
+
+    This is not the export pipeline (see PipelineKNN): ratings live in user
+    -> movies and movie -> users maps, so an update is O(1) and a query only
+    touches users who share a movie with the target. Scores follow
+    KNNtrain_simple.py: a similarity-weighted average over the neighbors who
+    rated each movie.
+    """
+
+    def __init__(self, k=40):
+        self.k = k
+        self.user_items = defaultdict(dict)
+        self.item_users = defaultdict(dict)
+        self.norm_sq = defaultdict(float)
+
+    def add(self, user_id, movie_id, rating):
+        """Insert or overwrite one rating"""
+        old = self.user_items[user_id].get(movie_id)
+        if old is not None:
+            self.norm_sq[user_id] -= old * old
+        self.user_items[user_id][movie_id] = rating
+        self.item_users[movie_id][user_id] = rating
+        self.norm_sq[user_id] += rating * rating
+
+    def add_batch(self, events):
+        for user_id, movie_id, rating in events:
+            self.add(int(user_id), int(movie_id), float(rating))
+
+    def neighbors(self, user_id):
+        """Top-k (similarity, user) pairs among users sharing at least one movie"""
+        items = self.user_items.get(user_id)
+        if not items:
+            return []
+        dots = defaultdict(float)
+        for movie_id, rating in items.items():
+            for other, other_rating in self.item_users[movie_id].items():
+                dots[other] += rating * other_rating
+        dots.pop(user_id, None)
+        norm = self.norm_sq[user_id] ** 0.5
+        return heapq.nlargest(self.k, ((dot / (norm * self.norm_sq[v] ** 0.5), v) for v, dot in dots.items()))
+
+    def recommend(self, user_id, n=10):
+        """Top-n unrated movies as (movieId, score) pairs, best first"""
+        seen = self.user_items.get(user_id, {})
+        numerator = defaultdict(float)
+        denominator = defaultdict(float)
+        for similarity, other in self.neighbors(user_id):
+            for movie_id, rating in self.user_items[other].items():
+                if movie_id not in seen:
+                    numerator[movie_id] += similarity * rating
+                    denominator[movie_id] += similarity
+        best = heapq.nlargest(n, ((numerator[m] / denominator[m], m) for m in numerator if denominator[m] > 0))
+        return [(movie_id, score) for score, movie_id in best]
+
+
+def percentiles(values_ms):
+    """p50/p95/p99/max of a list of millisecond timings"""
+    if not values_ms:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values_ms = np.asarray(values_ms)
+    p50, p95, p99 = np.percentile(values_ms, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(values_ms.max())}
+
+
+def replay(ratings, model, batch_size=1000, queries_per_batch=10, warmup_fraction=0.0, max_events=None, seed=42):
+    """Feed ratings in time order one batch at a time, querying recently active users between batches"""
+    events = ratings.sort_values('timestamp', kind='stable')[['userId', 'movieId', 'rating']].to_numpy()
+    warmup = int(len(events) * warmup_fraction)
+    if warmup:
+        model.add_batch(events[:warmup])
+    events = events[warmup:]
+    if max_events is not None:
+        events = events[:max_events]
+
+    rng = np.random.default_rng(seed)
+    update_ms, event_us, query_ms = [], [], []
+    update_total = query_total = 0.0
+
+    for start in range(0, len(events), batch_size):
+        batch = events[start:start + batch_size]
+        t = time.perf_counter()
+        model.add_batch(batch)
+        elapsed = time.perf_counter() - t
+        update_ms.append(elapsed * 1000)
+        # Per event: the batch's time spread over its events (--batch-size 1 times single events)
+        event_us.append(elapsed * 1e6 / len(batch))
+        update_total += elapsed
+
+        # Users who just rated something are the ones likely to open the app next
+        active = np.unique(batch[:, 0]).astype(int)
+        for user_id in rng.choice(active, size=min(queries_per_batch, len(active)), replace=False):
+            t = time.perf_counter()
+            model.recommend(int(user_id))
+            elapsed = time.perf_counter() - t
+            query_ms.append(elapsed * 1000)
+            query_total += elapsed
+
+    return {
+        "warmup_events": warmup,
+        "events": int(len(events)),
+        "batches": len(update_ms),
+        "queries": len(query_ms),
+        "batch_update_latency_ms": percentiles(update_ms),
+        "event_update_latency_us": percentiles(event_us),
+        "query_latency_ms": percentiles(query_ms),
+        "updates_per_second": len(events) / update_total if update_total else 0.0,
+        "queries_per_second": len(query_ms) / query_total if query_total else 0.0,
+        "wall_seconds": update_total + query_total,
+    }
+
+
+MODELS = {"pipeline": PipelineKNN, "incremental": IncrementalKNN}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timestamp-ordered replay benchmark for the KNN pipeline")
+    parser.add_argument("--ratings", default="ratings.csv")
+    parser.add_argument("--model", default="pipeline", choices=list(MODELS),
+                        help="pipeline: the exporters' sparse-matrix KNN; incremental: the standalone dict model")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--queries-per-batch", type=int, default=10)
+    parser.add_argument("--warmup-fraction", type=float, default=0.0,
+                        help="share of the oldest ratings loaded before timing starts")
+    parser.add_argument("--max-events", type=int)
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--json-out", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    ratings = pd.read_csv(args.ratings)
+    print(f"Replaying {len(ratings)} ratings from {pd.to_datetime(ratings.timestamp.min(), unit='s').date()} "
+          f"to {pd.to_datetime(ratings.timestamp.max(), unit='s').date()}")
+
+    results = replay(ratings, MODELS[args.model](k=args.k), args.batch_size, args.queries_per_batch,
+                     args.warmup_fraction, args.max_events)
+
+    print(f"\n=== Replay Results ({args.model}) ===")
+    print(f"Events: {results['events']} in {results['batches']} batches (+{results['warmup_events']} warmup)")
+    print(f"Queries: {results['queries']}")
+    for name in ("event_update_latency_us", "batch_update_latency_ms", "query_latency_ms"):
+        stats = results[name]
+        print(f"{name}: p50 {stats['p50']:.3f}, p95 {stats['p95']:.3f}, p99 {stats['p99']:.3f}, max {stats['max']:.3f}")
+    print(f"Update throughput: {results['updates_per_second']:,.0f} events/s")
+    print(f"Query throughput: {results['queries_per_second']:,.1f} queries/s")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
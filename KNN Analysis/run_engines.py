@@ -0,0 +1,378 @@
+# pip install pandas numpy scipy scikit-learn (scikit-surprise optional)
+# Run every registered engine in one process on the same loaded data and split
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import KNNtrain_simple
+import KNNtrain_sklearn
+from als_engine import ALSModel
+from bias_baseline import BiasBaseline, with_fallback
+from content_index import ContentIndex, load_content, blend_cold_items
+from neighbor_graph import build_user_item_matrix
+from popularity_index import PopularityIndex
+from ranking_metrics import ranking_metrics
+from splits import split_ratings
+
+
+class SharedData:
+    """Ratings loaded and split once, with the train matrices every engine reads from"""
+
+    def __init__(self, ratings, links, test_fraction=0.2, seed=42):
+        self.ratings = ratings
+        self.links = links
+        self.train, self.test = split_ratings(ratings, test_fraction, seed)
+        self.matrix, self.user_ids, self.movie_ids = build_user_item_matrix(self.train)
+        # Engines share these arrays, so guard them against accidental in-place edits
+        for array in (self.matrix.data, self.matrix.indices, self.matrix.indptr, self.user_ids, self.movie_ids):
+            array.setflags(write=False)
+        self._dense = None
+
+    @property
+    def dense(self):
+        """Dense user x movie DataFrame, the same as the trainers' pivot_table(...).fillna(0)"""
+        if self._dense is None:
+            self._dense = pd.DataFrame(self.matrix.toarray(), index=self.user_ids, columns=self.movie_ids)
+        return self._dense
+
+    def rows(self, user_ids):
+        """Train matrix rows of userIds; raises KeyError for users with no training ratings"""
+        user_ids = np.asarray(user_ids)
+        rows = np.searchsorted(self.user_ids, user_ids)
+        known = rows < len(self.user_ids)
+        known[known] = self.user_ids[rows[known]] == user_ids[known]
+        if not known.all():
+            raise KeyError(f"Unknown userIds {user_ids[~known].tolist()}")
+        return rows
+
+
+ENGINES = {}
+
+
+def register_engine(name):
+    """Class decorator that adds an engine to the runner"""
+    def decorator(cls):
+        cls.name = name
+        ENGINES[name] = cls
+        return cls
+    return decorator
+
+
+class Engine:
+    """Engine interface: fit on SharedData, predict test rows, recommend for users"""
+
+    def fit(self, data):
+        raise NotImplementedError
+
+    def predict(self, test):
+        """Predicted rating per test row, NaN where the engine cannot predict"""
+        raise NotImplementedError
+
+    def recommend(self, user_ids, n=10):
+        """{userId: [{'movieId', 'score'}, ...]} for the given users"""
+        raise NotImplementedError
+
+
+class _SklearnNeighborsEngine(Engine):
+    """Shared fitting and per-user neighbor lookup for the two sklearn trainers.
+
+    With min_neighbors set, test ratings that fewer neighbors rated (or
+    whose user or movie is missing from the train matrix) fall back to the
+    bias baseline.
+    """
+    module = None
+    min_neighbors = None
+
+    def fit(self, data):
+        self.data = data
+        self.knn = self.module.train_knn_model(data.dense, k=40)
+        self.baseline = BiasBaseline().fit(data.train) if self.min_neighbors else None
+        return self
+
+    def predict(self, test):
+        matrix = self.data.dense
+        predicted = pd.Series(np.nan, index=test.index)
+        raters = pd.Series(0, index=test.index)
+        known = test[test['userId'].isin(matrix.index) & test['movieId'].isin(matrix.columns)]
+        by_user = known.groupby('userId')
+        users = list(by_user.groups)
+        if not users and self.baseline is None:
+            return predicted.to_numpy()
+        # One kneighbors call for every test user instead of one per user
+        distances, indices = self.knn.kneighbors(matrix.loc[users]) if users else ([], [])
+        for (user_id, user_test), dist, idx in zip(by_user, distances, indices):
+            neighbors = matrix.iloc[idx][user_test['movieId']].to_numpy()
+            predicted[user_test.index] = self._weighted(neighbors, 1 / (dist + 1e-6))
+            raters[user_test.index] = (neighbors > 0).sum(axis=0)
+        if self.baseline is not None:
+            return with_fallback(predicted.to_numpy(), raters.to_numpy(), self.baseline.predict_frame(test),
+                                 self.min_neighbors)
+        return predicted.to_numpy()
+
+    def recommend(self, user_ids, n=10):
+        return {
+            user_id: self.module.get_recommendations(self.data.dense, self.knn, user_id, n_recommendations=n)
+            for user_id in user_ids
+        }
+
+
+@register_engine("sklearn")
+class SklearnEngine(_SklearnNeighborsEngine):
+    """KNNtrain_sklearn.py: weighted average over all neighbors, unrated counted as 0"""
+    module = KNNtrain_sklearn
+
+    @staticmethod
+    def _weighted(ratings, weights):
+        return np.average(ratings, weights=weights, axis=0)
+
+
+@register_engine("simple")
+class SimpleEngine(_SklearnNeighborsEngine):
+    """KNNtrain_simple.py: weighted average over the neighbors who rated the movie"""
+    module = KNNtrain_simple
+
+    @staticmethod
+    def _weighted(ratings, weights):
+        rated = ratings > 0
+        total = (weights[:, None] * rated).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 0, (weights[:, None] * ratings).sum(axis=0) / total, np.nan)
+
+
+@register_engine("simple+baseline")
+class SimpleBaselineEngine(SimpleEngine):
+    """KNNtrain_simple.py scoring, with the bias baseline when fewer than 3 neighbors rated the movie"""
+    min_neighbors = 3
+
+
+@register_engine("simple+content")
+class SimpleContentEngine(SimpleEngine):
+    """KNNtrain_simple.py scoring blended with content_index.py scores, so rarely rated movies can surface"""
+    content = None
+
+    def fit(self, data):
+        super().fit(data)
+        if SimpleContentEngine.content is None:
+            # Genres and tags don't depend on the split, so every fit shares one index
+            SimpleContentEngine.content = ContentIndex.build(*load_content())
+        self.rating_counts = data.train['movieId'].value_counts().to_dict()
+        self.profiles = {user_id: dict(zip(group['movieId'], group['rating']))
+                         for user_id, group in data.train.groupby('userId')}
+        return self
+
+    def knn_scores(self, user_id):
+        """{movieId: predicted rating} for every unrated movie at least one neighbor rated, as get_recommendations scores them"""
+        matrix = self.data.dense
+        if user_id not in matrix.index:
+            return {}
+        values = matrix.to_numpy()
+        row = values[matrix.index.get_loc(user_id)]
+        distances, indices = self.knn.kneighbors([row])
+        predicted = self._weighted(values[indices[0]], 1 / (distances[0] + 1e-6))
+        valid = (row == 0) & (np.nan_to_num(predicted) > 0)
+        return dict(zip(matrix.columns[valid].tolist(), predicted[valid].tolist()))
+
+    def recommend(self, user_ids, n=10):
+        recommendations = {}
+        for user_id in user_ids:
+            profile = self.profiles.get(user_id, {})
+            knn_scores = self.knn_scores(user_id)
+            # Oversample both sides so the blend can reorder beyond each list's own top n, then score
+            # every candidate on both sides rather than treating "not in the other top list" as 0
+            knn_top = sorted(knn_scores, key=lambda m: -knn_scores[m])[:3 * n]
+            content_top = [movie_id for movie_id, _ in self.content.recommend_for_profile(profile, n=3 * n)]
+            candidates = knn_top + content_top
+            content_scores = self.content.lookup(self.content.profile_scores(profile), candidates)
+            recommendations[user_id] = blend_cold_items(candidates, knn_scores, content_scores, self.rating_counts, n=n)
+        return recommendations
+
+
+@register_engine("baseline")
+class BaselineEngine(Engine):
+    """bias_baseline.py: global mean + user and item biases"""
+
+    def fit(self, data):
+        self.data = data
+        self.model = BiasBaseline().fit(data.train)
+        return self
+
+    def predict(self, test):
+        return self.model.predict_frame(test)
+
+    def recommend(self, user_ids, n=10):
+        # The user bias shifts every movie equally, so the ranking is by item bias alone
+        cols = pd.Index(self.model.movie_ids).get_indexer(self.data.movie_ids)
+        item_scores = self.model.item_bias[cols]
+        order = np.argsort(-item_scores, kind='stable')
+        recommendations = {}
+        for user_id, row in zip(user_ids, self.data.rows(user_ids)):
+            row = self.data.matrix[int(row)]
+            top = order[~np.isin(order, row.indices)][:n]
+            scores = self.model.predict(np.full(len(top), user_id), self.data.movie_ids[top])
+            recommendations[user_id] = [{'movieId': int(self.data.movie_ids[i]), 'score': float(s)}
+                                        for i, s in zip(top, scores)]
+        return recommendations
+
+
+@register_engine("popularity")
+class PopularityEngine(Engine):
+    """popularity_index.py: time-decayed popularity as of the last training rating, the cold-start fallback"""
+
+    def fit(self, data):
+        self.data = data
+        train = data.train.sort_values('timestamp', kind='stable')
+        self.index = PopularityIndex().update(train['movieId'], train['rating'], train['timestamp'])
+        self.bayesian = pd.Series(self.index.scores("bayesian"), index=self.index.movie_ids)
+        return self
+
+    def predict(self, test):
+        # Shrunk, time-weighted mean rating of the movie; NaN for movies never rated in training
+        return self.bayesian.reindex(test['movieId']).to_numpy()
+
+    def recommend(self, user_ids, n=10):
+        recommendations = {}
+        for user_id, row in zip(user_ids, self.data.rows(user_ids)):
+            row = self.data.matrix[int(row)]
+            seen = set(self.data.movie_ids[row.indices].tolist())
+            recommendations[user_id] = [{'movieId': movie_id, 'score': score}
+                                        for movie_id, score in self.index.top(n, seen)]
+        return recommendations
+
+
+@register_engine("als")
+class ALSEngine(Engine):
+    """als_engine.py: explicit ALS on the shared sparse matrix"""
+
+    def fit(self, data):
+        self.data = data
+        self.model = ALSModel().fit(data.matrix, data.user_ids, data.movie_ids)
+        self.user_pos = pd.Index(data.user_ids)
+        self.movie_pos = pd.Index(data.movie_ids)
+        return self
+
+    def predict(self, test):
+        rows = self.user_pos.get_indexer(test['userId'])
+        cols = self.movie_pos.get_indexer(test['movieId'])
+        known = (rows >= 0) & (cols >= 0)
+        predicted = np.full(len(test), np.nan)
+        predicted[known] = np.clip(self.model.predict(rows[known], cols[known]), 0.5, 5.0)
+        return predicted
+
+    def recommend(self, user_ids, n=10):
+        rows = self.data.rows(user_ids)
+        scores = self.model.global_mean + self.model.user_factors[rows] @ self.model.item_factors.T
+        seen = self.data.matrix[rows]
+        scores[np.repeat(np.arange(len(rows)), np.diff(seen.indptr)), seen.indices] = -np.inf
+        top = np.argsort(-scores, axis=1, kind='stable')[:, :n]
+        return {
+            user_id: [{'movieId': int(self.data.movie_ids[i]), 'score': float(scores[row, i])} for i in top[row]]
+            for row, user_id in enumerate(user_ids)
+        }
+
+
+@register_engine("surprise")
+class SurpriseEngine(Engine):
+    """KNNtrain.py: Surprise KNNBasic, only available when scikit-surprise is installed"""
+
+    def fit(self, data):
+        import KNNtrain
+        from surprise import Dataset, Reader
+
+        self.knntrain = KNNtrain
+        reader = Reader(rating_scale=(0.5, 5.0))
+        self.trainset = Dataset.load_from_df(data.train[['userId', 'movieId', 'rating']], reader).build_full_trainset()
+        self.algo = KNNtrain.train_knn_model(self.trainset)
+        return self
+
+    def predict(self, test):
+        predicted = np.full(len(test), np.nan)
+        for row, (user_id, movie_id) in enumerate(zip(test['userId'], test['movieId'])):
+            prediction = self.algo.predict(user_id, movie_id)
+            if not prediction.details.get('was_impossible', False):
+                predicted[row] = prediction.est
+        return predicted
+
+    def recommend(self, user_ids, n=10):
+        inner = [self.trainset.to_inner_uid(user_id) for user_id in user_ids]
+        return {
+            uid: [{'movieId': int(mid), 'score': float(score)} for mid, score in recs]
+            for uid, recs in self.knntrain.stream_top_n(self.algo, self.trainset, n=n, users=inner)
+        }
+
+
+def run_engine(engine_cls, data, rank_users, k=10):
+    """Fit and evaluate one engine, timing every stage"""
+    engine = engine_cls()
+    row = {}
+
+    start = time.perf_counter()
+    engine.fit(data)
+    row['fit s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predicted = engine.predict(data.test)
+    row['predict s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    recommendations = engine.recommend(rank_users, n=k)
+    row['recommend s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    known = ~np.isnan(predicted)
+    actual = data.test['rating'].to_numpy()
+    metrics = {
+        'RMSE': float(np.sqrt(np.mean((actual[known] - predicted[known]) ** 2))) if known.any() else np.nan,
+        'MAE': float(np.mean(np.abs(actual[known] - predicted[known]))) if known.any() else np.nan,
+        'Predicted': int(known.sum()),
+    }
+    metrics.update(ranking_metrics(recommendations, data.test, k=k, catalog_size=len(data.movie_ids)))
+    row['evaluate s'] = time.perf_counter() - start
+
+    return {**metrics, **row}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare all recommendation engines on one shared split")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument("--rank-users", type=int, default=100,
+                        help="number of test users sampled for ranking metrics (0 = all)")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    stages = {}
+    start = time.perf_counter()
+    ratings, links = KNNtrain_sklearn.load_data()
+    stages['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    data = SharedData(ratings, links)
+    stages['split + matrix'] = time.perf_counter() - start
+    print(f"Training on {len(data.train)} ratings, testing on {len(data.test)} ratings "
+          f"({data.matrix.shape[0]} users x {data.matrix.shape[1]} movies)")
+
+    # Every engine is ranked on the same sample of test users
+    test_users = np.intersect1d(data.test['userId'].unique(), data.user_ids)
+    if 0 < args.rank_users < len(test_users):
+        test_users = np.sort(np.random.default_rng(42).choice(test_users, args.rank_users, replace=False))
+    rank_users = [int(user_id) for user_id in test_users]
+
+    results = {}
+    for name in args.engines:
+        print(f"\nRunning {name}...")
+        try:
+            results[name] = run_engine(ENGINES[name], data, rank_users, k=args.k)
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+
+    print("\n=== Shared Stages ===")
+    for stage, seconds in stages.items():
+        print(f"{stage}: {seconds:.2f}s")
+
+    print(f"\n=== Engine Comparison ({len(rank_users)} users ranked) ===")
+    print(pd.DataFrame(results).to_string(float_format=lambda v: f"{v:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
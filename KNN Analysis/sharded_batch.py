@@ -0,0 +1,181 @@
+# pip install pandas numpy scipy
+# Sharded batch export: independent workers score user shards against one shared matrix artifact, then a merge
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from delta_export import add_delta_arguments, replace_with_delta
+from memory_budget import iter_budgeted_recommendations, write_export_stream
+from neighbor_graph import load_ratings, build_user_item_matrix, iter_topk_blocks
+
+
+def file_checksum(path):
+    """sha256 of a file, so workers can prove they scored against the same artifact"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shard_ranges(n_users, shards):
+    """Contiguous, balanced [first, stop) row ranges, one per shard"""
+    bounds = np.linspace(0, n_users, shards + 1).round().astype(int)
+    return [[int(a), int(b)] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def prepare(work_dir, ratings_path="ratings.csv", links_path="links.csv", shards=4, k=40, n=10):
+    """Write the read-only matrix artifact and the manifest every worker and the merge step read"""
+    os.makedirs(work_dir, exist_ok=True)
+    matrix, user_ids, movie_ids = build_user_item_matrix(load_ratings(ratings_path))
+    artifact = os.path.join(work_dir, "matrix.npz")
+    np.savez(artifact, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+             shape=np.array(matrix.shape), user_ids=user_ids, movie_ids=movie_ids)
+    shutil.copyfile(links_path, os.path.join(work_dir, "links.csv"))
+
+    manifest = {"shards": shards, "k": k, "n": n, "users": int(matrix.shape[0]),
+                "ranges": shard_ranges(matrix.shape[0], shards), "checksum": file_checksum(artifact)}
+    with open(os.path.join(work_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_artifact(work_dir):
+    """(manifest, matrix, user_ids, movie_ids) from a prepared directory"""
+    with open(os.path.join(work_dir, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+    with np.load(os.path.join(work_dir, "matrix.npz"), allow_pickle=False) as f:
+        matrix = sparse.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+        user_ids, movie_ids = f["user_ids"], f["movie_ids"]
+    return manifest, matrix, user_ids, movie_ids
+
+
+def shard_path(work_dir, shard):
+    return os.path.join(work_dir, f"shard_{shard:04d}.json")
+
+
+def run_worker(work_dir, shard, row_block=1024, col_block=8192, score_block=256):
+    """Compute neighbors and recommendations for one shard's users and write them atomically"""
+    manifest, matrix, user_ids, movie_ids = load_artifact(work_dir)
+    checksum = file_checksum(os.path.join(work_dir, "matrix.npz"))
+    if checksum != manifest["checksum"]:
+        raise ValueError(f"{work_dir}/matrix.npz does not match the manifest; re-run prepare")
+    first, stop = manifest["ranges"][shard]
+    k = manifest["k"]
+
+    neighbors = np.zeros((stop - first, min(k - 1, matrix.shape[0] - 1)), dtype=np.int32)
+    similarities = np.zeros(neighbors.shape, dtype=np.float32)
+    for start, idx, sims in iter_topk_blocks(matrix, k - 1, row_block, col_block, row_range=(first, stop)):
+        neighbors[start - first:start - first + len(idx)] = idx
+        similarities[start - first:start - first + len(sims)] = sims
+
+    recs = iter_budgeted_recommendations(matrix, movie_ids, neighbors, similarities, score_block,
+                                         manifest["n"], row_range=(first, stop))
+    output = {"shard": shard, "range": [first, stop], "checksum": checksum,
+              "users": [[int(user_ids[row]), user_recs] for row, user_recs in recs]}
+
+    # A shard file only ever appears complete, so a crashed worker is simply re-run
+    path = shard_path(work_dir, shard)
+    with open(path + ".tmp", "w") as f:
+        json.dump(output, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+    return len(output["users"])
+
+
+def merge(work_dir, out):
+    """Combine every shard, in user order, into the standard export"""
+    with open(os.path.join(work_dir, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+    missing = [shard for shard in range(manifest["shards"]) if not os.path.exists(shard_path(work_dir, shard))]
+    if missing:
+        raise ValueError(f"Shards not finished yet: {missing}")
+
+    def user_recs():
+        for shard in range(manifest["shards"]):
+            with open(shard_path(work_dir, shard), "r") as f:
+                output = json.load(f)
+            if output["checksum"] != manifest["checksum"] or output["range"] != manifest["ranges"][shard]:
+                raise ValueError(f"Shard {shard} was computed from a different artifact or partition")
+            for user_id, recs in output["users"]:
+                yield user_id, [(mid, score) for mid, score in recs]
+
+    return write_export_stream(user_recs(), pd.read_csv(os.path.join(work_dir, "links.csv")), out)
+
+
+def run_local(work_dir, out, workers=4, **prepare_options):
+    """prepare, one worker process per shard (at most `workers` at a time), then merge"""
+    manifest = prepare(work_dir, **prepare_options)
+    pending = list(range(manifest["shards"]))
+    running = []
+    while pending or running:
+        while pending and len(running) < workers:
+            shard = pending.pop(0)
+            command = [sys.executable, os.path.abspath(__file__), "worker", work_dir, "--shard", str(shard)]
+            running.append((shard, subprocess.Popen(command)))
+        shard, process = running.pop(0)
+        if process.wait() != 0:
+            raise RuntimeError(f"Worker for shard {shard} failed with exit code {process.returncode}")
+    return merge(work_dir, out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded neighbor and recommendation batch with a merge step")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    prep = commands.add_parser("prepare", help="write the shared matrix artifact and manifest")
+    local = commands.add_parser("local", help="prepare, run every shard in local worker processes and merge")
+    for sub in (prep, local):
+        sub.add_argument("work_dir")
+        sub.add_argument("--ratings", default="ratings.csv")
+        sub.add_argument("--links", default="links.csv")
+        sub.add_argument("--shards", type=int, default=4)
+        sub.add_argument("--k", type=int, default=40)
+        sub.add_argument("--n", type=int, default=10)
+    local.add_argument("--workers", type=int, default=4, help="worker processes running at once")
+    local.add_argument("--out", default="knn_recs_sklearn.json")
+    add_delta_arguments(local)
+
+    worker = commands.add_parser("worker", help="compute one shard (any host that can read work_dir)")
+    worker.add_argument("work_dir")
+    worker.add_argument("--shard", type=int, required=True)
+    worker.add_argument("--score-block", type=int, default=256)
+
+    merger = commands.add_parser("merge", help="combine finished shards into the export")
+    merger.add_argument("work_dir")
+    merger.add_argument("--out", default="knn_recs_sklearn.json")
+    add_delta_arguments(merger)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "prepare":
+        manifest = prepare(args.work_dir, args.ratings, args.links, args.shards, args.k, args.n)
+        print(f"Prepared {manifest['users']} users in {manifest['shards']} shards under {args.work_dir}/")
+    elif args.command == "worker":
+        users = run_worker(args.work_dir, args.shard, score_block=args.score_block)
+        print(f"Shard {args.shard}: {users} users in {time.perf_counter() - start:.2f}s")
+    else:
+        # With --delta-out the merge streams to a side file first, so the previous export is still there to diff
+        target = args.out + ".tmp" if args.delta_out else args.out
+        if args.command == "merge":
+            users = merge(args.work_dir, target)
+            print(f"Merged {users} users into {args.out}")
+        else:
+            users = run_local(args.work_dir, target, args.workers, ratings_path=args.ratings,
+                              links_path=args.links, shards=args.shards, k=args.k, n=args.n)
+            print(f"Merged {users} users into {args.out} in {time.perf_counter() - start:.2f}s")
+        if args.delta_out:
+            changes = replace_with_delta(target, args.out, args.delta_out, args.tolerance)
+            print(f"Wrote {args.delta_out} ({len(changes)} changed users)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# pip install numpy scipy
+# Offline social-neighbor precomputation from an exported snapshot of the app's users and watched collections
+import argparse
+import json
+import time
+
+import numpy as np
+from scipy import sparse
+
+from neighbor_graph import select_topk
+
+MIN_WATCHED = 3      # same cutoff socialRecs.getAllUsersWatched uses for candidate neighbors
+FRIEND_BOOST = 1.5   # same boost socialRecs.findKNearestNeighbors gives friends
+
+
+def load_snapshot(path):
+    """Load a snapshot shaped like {"users": {uid: userDoc}, "watched": {uid: watchedDoc}}"""
+    with open(path, "r") as f:
+        snapshot = json.load(f)
+    users = {uid: doc for uid, doc in snapshot.get("users", {}).items() if uid != "usernames"}
+    watched = snapshot.get("watched", {})
+    return users, watched
+
+
+def content_key(item):
+    """Same `${media_type || 'movie'}_${id}` key the app uses"""
+    return f"{item.get('media_type') or 'movie'}_{item['id']}"
+
+
+def build_watched_matrices(users, watched):
+    """Rating matrix, watched-pattern matrix and row uids for every user in the snapshot"""
+    uids = sorted(users)
+    keys = {}
+    rows, cols, values = [], [], []
+    for row, uid in enumerate(uids):
+        # Like the app's Map, a repeated content key keeps its last rating
+        user_items = {}
+        for item in (watched.get(uid) or {}).values():
+            if isinstance(item, dict) and "id" in item:
+                user_items[content_key(item)] = float(item.get("rating") or 0)
+        for key, rating in user_items.items():
+            rows.append(row)
+            cols.append(keys.setdefault(key, len(keys)))
+            values.append(rating)
+
+    shape = (len(uids), len(keys))
+    # Build the pattern separately: a watched item rated 0 (unrated) still counts as a common item
+    pattern = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+    ratings = sparse.csr_matrix((values, (rows, cols)), shape=shape)
+    return ratings, pattern, uids, list(keys)
+
+
+def build_friend_matrix(users, uids):
+    """Sparse matrix with a 1 where the row user lists the column user as a friend"""
+    position = {uid: row for row, uid in enumerate(uids)}
+    rows, cols = [], []
+    for uid in uids:
+        for friend in users[uid].get("friends") or []:
+            if friend in position:
+                rows.append(position[uid])
+                cols.append(position[friend])
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(uids), len(uids)))
+
+
+def common_item_similarity(ratings, squared, pattern, start, stop):
+    """Dense (stop - start) x users similarity block, as calculateUserSimilarity defines it.
+
+    Cosine over the items both users watched, with both norms taken over
+    those common items only; squared is ratings with every value squared.
+    """
+    dot = (ratings[start:stop] @ ratings.T).toarray()
+    target_norm = (squared[start:stop] @ pattern.T).toarray()
+    neighbor_norm = (pattern[start:stop] @ squared.T).toarray()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where((target_norm > 0) & (neighbor_norm > 0), dot / np.sqrt(target_norm * neighbor_norm), 0.0)
+
+
+def iter_social_neighbors(ratings, pattern, friends, k=15, block_size=1024, min_watched=MIN_WATCHED,
+                          friend_boost=FRIEND_BOOST):
+    """Yield (start, neighbor_idx, similarity, is_friend) for blocks of users.
+
+    Similarity matches calculateUserSimilarity in socialRecs.js (see
+    common_item_similarity). Friends get the same similarity boost the app
+    applies.
+    """
+    squared = ratings.multiply(ratings).tocsr()
+    n_users = ratings.shape[0]
+    k = min(k, n_users - 1)
+    eligible = np.asarray(pattern.sum(axis=1)).ravel() >= min_watched
+
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        sims = common_item_similarity(ratings, squared, pattern, start, stop)
+        is_friend = friends[start:stop].toarray() > 0
+        sims = np.where(is_friend, sims * friend_boost, sims)
+
+        # Never pick yourself or users with too little history
+        sims[:, ~eligible] = -np.inf
+        sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        idx = np.broadcast_to(np.arange(n_users), sims.shape)
+        top_sims, top_idx = select_topk(sims, idx, k)
+        yield start, top_idx, top_sims, np.take_along_axis(is_friend, top_idx, axis=1)
+
+
+def compute_neighbor_table(users, watched, k=15, block_size=1024):
+    """{uid: [[neighborUid, similarity, isFriend], ...]} with zero-similarity neighbors dropped"""
+    ratings, pattern, uids, _ = build_watched_matrices(users, watched)
+    friends = build_friend_matrix(users, uids)
+
+    table = {}
+    for start, idx, sims, is_friend in iter_social_neighbors(ratings, pattern, friends, k, block_size):
+        for offset in range(len(idx)):
+            table[uids[start + offset]] = [
+                [uids[j], round(float(s), 6), int(f)]
+                for j, s, f in zip(idx[offset], sims[offset], is_friend[offset])
+                if s > 0
+            ]
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute every app user's top-k social neighbors")
+    parser.add_argument("snapshot", help="JSON export of the users and watched collections")
+    parser.add_argument("--k", type=int, default=15, help="neighbors per user (the app uses 15)")
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--out", default="social_neighbors.json")
+    args = parser.parse_args()
+
+    users, watched = load_snapshot(args.snapshot)
+    print(f"Loaded {len(users)} users and {len(watched)} watched docs")
+
+    start = time.perf_counter()
+    table = compute_neighbor_table(users, watched, k=args.k, block_size=args.block_size)
+    elapsed = time.perf_counter() - start
+
+    with open(args.out, "w") as f:
+        json.dump({"k": args.k, "fields": ["uid", "similarity", "isFriend"], "neighbors": table},
+                  f, separators=(",", ":"))
+    print(f"Wrote {args.out} in {elapsed:.2f}s")
+
+    with_neighbors = sum(1 for rows in table.values() if rows)
+    print(f"\n=== Summary ===")
+    print(f"Users with at least one neighbor: {with_neighbors} of {len(table)}")
+    if with_neighbors:
+        print(f"Average neighbors per user: {np.mean([len(rows) for rows in table.values() if rows]):.1f}")
+
+
+if __name__ == "__main__":
+    main()
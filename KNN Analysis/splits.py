@@ -0,0 +1,10 @@
+# pip install numpy
+# Train/test split shared by the trainers, the engine runner and the baselines
+import numpy as np
+
+
+def split_ratings(ratings, test_fraction=0.2, seed=42):
+    """Random rating-level split, the same one KNNtrain_simple.evaluate_basic uses"""
+    np.random.seed(seed)
+    mask = np.random.rand(len(ratings)) < 1 - test_fraction
+    return ratings[mask], ratings[~mask]
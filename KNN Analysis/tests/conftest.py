@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The analysis scripts import each other as top-level modules and read data relative to their folder
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ANALYSIS_DIR)
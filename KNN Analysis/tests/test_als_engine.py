@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+from als_engine import ALSModel
+from inverted_index import long_tail_matrix
+
+
+@pytest.mark.parametrize("implicit", [False, True])
+def test_blocked_outer_products_match_one_block(implicit):
+    matrix = long_tail_matrix(150, 400, seed=11)
+    whole = ALSModel(factors=8, iterations=3, implicit=implicit, max_chunk_rows=64).fit(matrix)
+    blocked = ALSModel(factors=8, iterations=3, implicit=implicit, max_chunk_rows=64, max_outer_rows=37).fit(matrix)
+    np.testing.assert_allclose(blocked.user_factors, whole.user_factors, atol=1e-10)
+    np.testing.assert_allclose(blocked.item_factors, whole.item_factors, atol=1e-10)
@@ -0,0 +1,56 @@
+import json
+
+from delta_export import LocalStore, apply_changeset, diff_exports, recs_equal
+
+
+def recs(*pairs):
+    return [{"movieId": movie_id, "tmdbId": movie_id * 10, "score": score} for movie_id, score in pairs]
+
+
+OLD = {
+    "1": recs((1, 4.5), (2, 4.0)),
+    "2": recs((3, 3.9), (4, 3.5)),
+    "3": recs((5, 4.2), (6, 4.1)),
+    "5": recs((7, 4.0)),
+    "6": recs((8, 4.8), (9, 4.4)),
+    "7": [],
+}
+NEW = {
+    "1": recs((1, 4.5), (2, 4.0)),
+    "2": recs((3, 3.9 + 1e-12), (4, 3.5 - 1e-12)),    # rerun noise only
+    "3": recs((6, 4.1), (5, 4.2)),                    # same movies, new order
+    "4": recs((1, 4.0)),                              # new user
+    "6": recs((8, 4.2), (9, 4.4)),                    # real score change
+    "7": [],
+}
+
+
+def test_only_changed_users_produce_ops():
+    changes = diff_exports(OLD, NEW)
+    assert [(c["op"], c["userId"]) for c in changes] == [
+        ("upsert", "3"), ("upsert", "4"), ("delete", "5"), ("upsert", "6")]
+    assert len(diff_exports(OLD, NEW, tolerance=0.0)) == 5
+    assert diff_exports(NEW, NEW) == []
+
+
+def test_recs_equal_needs_same_movies_and_tmdb_ids():
+    assert not recs_equal(recs((1, 4.0)), recs((1, 4.0), (2, 3.0)))
+    assert not recs_equal(recs((1, 4.0)), [{"movieId": 1, "tmdbId": 99, "score": 4.0}])
+    assert recs_equal(recs((1, 4.0)), recs((1, 4.0 * (1 + 1e-4))))
+    assert not recs_equal(recs((1, 4.0)), recs((1, 4.0 * (1 + 1e-2))))
+
+
+def test_changeset_round_trip(tmp_path):
+    path = tmp_path / "store.json"
+    path.write_text(json.dumps(OLD))
+    store = LocalStore(str(path))
+    applied = apply_changeset(store, diff_exports(OLD, NEW))
+
+    assert applied == {"upsert": 3, "delete": 1}
+    assert store.writes == 4
+    assert set(store.docs) == set(NEW)
+    assert all(recs_equal(store.docs[user_id], NEW[user_id]) for user_id in NEW)
+    # Exact round trip once the tolerance is zero
+    store = LocalStore(str(path))
+    apply_changeset(store, diff_exports(OLD, NEW, tolerance=0.0))
+    assert store.docs == NEW
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import NearestNeighbors
+
+from inverted_index import InvertedIndexNeighbors, long_tail_matrix
+
+
+@pytest.mark.parametrize("exponent", [0.6, 1.1])
+def test_matches_brute_force(exponent):
+    matrix = long_tail_matrix(3000, 30000, exponent=exponent, seed=7)
+    index = InvertedIndexNeighbors(n_neighbors=20).fit(matrix)
+    distances, indices = index.kneighbors(matrix[:500])
+    brute_distances, _ = NearestNeighbors(n_neighbors=20, metric='cosine', algorithm='brute').fit(matrix) \
+        .kneighbors(matrix[:500])
+
+    np.testing.assert_allclose(distances, brute_distances, atol=1e-12)
+    # The indices returned really are at the reported distances
+    exact = np.array([(index.rows_[indices[i]] @ index.rows_[i].T).toarray().ravel() for i in range(500)])
+    np.testing.assert_allclose(1.0 - exact, distances, atol=1e-12)
+
+
+def test_early_termination_stays_exact():
+    matrix = long_tail_matrix(3000, 30000, exponent=0.6, seed=7)
+    index = InvertedIndexNeighbors(n_neighbors=5, popular_fraction=0.01).fit(matrix)
+    distances, _ = index.kneighbors(matrix[:500])
+    brute_distances, _ = NearestNeighbors(n_neighbors=5, metric='cosine', algorithm='brute').fit(matrix) \
+        .kneighbors(matrix[:500])
+    assert index.stats_["early_terminations"] > 0
+    np.testing.assert_allclose(distances, brute_distances, atol=1e-12)
+
+
+def test_fitted_rows_exclude_themselves():
+    matrix = long_tail_matrix(400, 2000, seed=3)
+    distances, indices = InvertedIndexNeighbors(n_neighbors=10).fit(matrix).kneighbors()
+    brute_distances, _ = NearestNeighbors(n_neighbors=10, metric='cosine', algorithm='brute').fit(matrix).kneighbors()
+    assert not (indices == np.arange(400)[:, None]).any()
+    np.testing.assert_allclose(distances, brute_distances, atol=1e-12)
@@ -0,0 +1,25 @@
+import pytest
+
+from memory_budget import BudgetError, parse_size, plan_pipeline
+
+MB = 2 ** 20
+
+
+def test_baseline_is_deducted_before_planning():
+    plan = plan_pipeline(610, 9724, 100836, 128 * MB, baseline=75 * MB)
+    assert plan["baseline"] == 75 * MB
+    # The same data fits a smaller budget once nothing else is running in the process
+    assert plan_pipeline(610, 9724, 100836, 53 * MB)["score_block"] == plan["score_block"]
+
+
+@pytest.mark.parametrize("budget, message", [(64, "less than the 75 MB"), (80, "leaves 5 MB after the 75 MB")])
+def test_budget_errors_name_the_baseline(budget, message):
+    with pytest.raises(BudgetError, match=message):
+        plan_pipeline(610, 9724, 100836, budget * MB, baseline=75 * MB)
+
+
+def test_parse_size():
+    assert parse_size("512MB") == 512 * MB
+    assert parse_size("1.5 gb") == int(1.5 * 2 ** 30)
+    with pytest.raises(BudgetError):
+        parse_size("lots")
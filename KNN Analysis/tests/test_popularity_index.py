@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from popularity_index import DAY, PopularityIndex
+from recommend import load_popular
+from run_engines import PopularityEngine, SharedData
+
+
+def full_ranking(index, by):
+    """The ranking re-sorted from scratch: score ('decayed': unscaled count) desc, movieId asc, active only"""
+    scores = index.scores(by)
+    keys = index.decayed_counts if by == "decayed" else scores
+    order = np.lexsort((index.movie_ids, -keys))
+    order = order[scores[order] > 0 if by == "window" else index.decayed_counts[order] > 0]
+    return index.movie_ids[order], scores[order]
+
+
+def test_window_expiry():
+    index = PopularityIndex(window_days=5, half_life_days=14)
+    index.update([1, 2, 2], [4.0, 3.0, 5.0], [0, DAY, 2 * DAY])
+    index.top(5, by="window")
+    # Day 6.5 expires day 0 and day 1 but not day 2; the expiry splits the first batch
+    index.update([3], [4.0], [6.5 * DAY])
+    assert dict(zip(index.movie_ids.tolist(), index.window_counts.tolist())) == {1: 0.0, 2: 1.0, 3: 1.0}
+    assert index.top(5, by="window") == [(2, 1.0), (3, 1.0)]
+    # Decayed counts never expire: 2 has two ratings 4.5 and 5.5 days old, 3 one fresh, 1 one 6.5 days old
+    assert [movie_id for movie_id, _ in index.top(5)] == [2, 3, 1]
+
+    index.update([3, 3], [4.0, 4.0], [20 * DAY, 20 * DAY])
+    assert index.top(5, by="window") == [(3, 2.0)]
+    assert sum(len(timestamps) for timestamps, _ in index.events) == 2
+
+
+def test_decay_rescaling_matches_direct_sum():
+    # A one-day half-life over four years moves the reference several times
+    rng = np.random.default_rng(0)
+    timestamps = np.sort(rng.uniform(0, 1500 * DAY, 400))
+    movie_ids = rng.integers(1, 30, len(timestamps))
+    ratings = rng.choice([1.0, 2.5, 4.0, 5.0], len(timestamps))
+
+    index = PopularityIndex(window_days=30, half_life_days=1, prior_weight=3)
+    for start in range(0, len(timestamps), 25):
+        index.update(movie_ids[start:start + 25], ratings[start:start + 25], timestamps[start:start + 25])
+    assert index.reference > timestamps[0]
+
+    now = timestamps[-1]
+    weights = 0.5 ** ((now - timestamps) / DAY)
+    expected = pd.DataFrame({"movieId": movie_ids, "w": weights, "wr": weights * ratings}).groupby("movieId").sum()
+    counts, sums = expected["w"].reindex(index.movie_ids).to_numpy(), expected["wr"].reindex(index.movie_ids).to_numpy()
+    np.testing.assert_allclose(index.scores("decayed"), counts, rtol=1e-9, atol=1e-300)
+    prior = sums.sum() / counts.sum()
+    np.testing.assert_allclose(index.scores("bayesian"), (3 * prior + sums) / (3 + counts), rtol=1e-9)
+
+
+def test_kept_rankings_match_a_full_sort():
+    rng = np.random.default_rng(1)
+    # The short half-life also moves the decay reference, which rebuilds the kept 'decayed' order
+    index = PopularityIndex(window_days=3, half_life_days=0.02)
+    now = 0.0
+    for step in range(60):
+        size = int(rng.integers(1, 30))
+        # Few movies and integer window counts give plenty of ties; new movies keep arriving
+        movie_ids = rng.integers(1, 20 + step, size)
+        now += rng.uniform(0, DAY)
+        index.update(movie_ids, rng.choice([2.0, 4.0, 5.0], size), now + rng.uniform(0, DAY, size))
+        for by in ("decayed", "window", "bayesian"):
+            ranked_ids, scores = index.ranking(by)
+            expected_ids, expected_scores = full_ranking(index, by)
+            np.testing.assert_array_equal(ranked_ids, expected_ids)
+            np.testing.assert_array_equal(scores, expected_scores)
+        exclude = set(expected_ids[:3].tolist())
+        assert index.top(4, exclude, "bayesian") == [
+            (m, s) for m, s in zip(expected_ids.tolist(), expected_scores.tolist()) if m not in exclude][:4]
+
+
+def test_save_load_round_trip(tmp_path):
+    rng = np.random.default_rng(2)
+    batches = [(rng.integers(1, 40, 50), rng.choice([3.0, 4.5], 50), np.sort(rng.uniform(day, day + 1, 50)) * DAY)
+               for day in range(0, 60, 2)]
+    index = PopularityIndex(window_days=10, half_life_days=7, prior_weight=5)
+    for batch in batches[:20]:
+        index.update(*batch)
+    path = tmp_path / "popularity.npz"
+    index.save(path, tmdb_ids={m: m * 10 for m in range(1, 30)}, by="window")
+
+    loaded = PopularityIndex.load(path)
+    assert (loaded.window, loaded.rate, loaded.prior_weight) == pytest.approx((index.window, index.rate, 5))
+    for by in ("decayed", "window", "bayesian"):
+        np.testing.assert_array_equal(loaded.ranking(by)[0], index.ranking(by)[0])
+        np.testing.assert_allclose(loaded.ranking(by)[1], index.ranking(by)[1])
+    popular = load_popular(path)
+    np.testing.assert_array_equal(popular["movie_ids"], index.ranking("window")[0])
+    np.testing.assert_array_equal(popular["tmdb_ids"], np.where(popular["movie_ids"] < 30, popular["movie_ids"] * 10, -1))
+
+    # The restored index keeps expiring and decaying exactly like the original
+    for batch in batches[20:]:
+        index.update(*batch)
+        loaded.update(*batch)
+    np.testing.assert_array_equal(loaded.window_counts, index.window_counts)
+    np.testing.assert_allclose(loaded.scores("decayed"), index.scores("decayed"))
+    assert loaded.top(5, by="window") == index.top(5, by="window")
+
+
+def test_engine_rejects_unknown_users():
+    ratings = pd.DataFrame({"userId": np.repeat([1, 3, 5], 20), "movieId": np.tile(np.arange(20), 3),
+                            "rating": 4.0, "timestamp": np.arange(60) * 1000})
+    data = SharedData(ratings, links=None, test_fraction=0.0)
+    engine = PopularityEngine().fit(data)
+    assert set(engine.recommend([1, 5], n=3)) == {1, 5}
+    # 2 and 6 would otherwise borrow the exclusions of users 3 and (past the end) 5
+    for user_id in (2, 6):
+        with pytest.raises(KeyError):
+            engine.recommend([1, user_id])
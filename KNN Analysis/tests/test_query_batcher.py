@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from inverted_index import long_tail_matrix
+from memory_budget import iter_budgeted_recommendations
+from neighbor_graph import iter_topk_blocks
+from query_batcher import KNNQueryEngine, MicroBatcher
+
+
+@pytest.fixture(scope="module")
+def engine():
+    matrix = long_tail_matrix(200, 500, seed=5)
+    # Odd userIds only, so rows and ids differ and even ids are unknown
+    return KNNQueryEngine(matrix, np.arange(1, 401, 2), np.arange(500) * 10, k=8)
+
+
+def test_batch_matches_export_scoring(engine):
+    neighbors, similarities = zip(*[(idx, sims) for _, idx, sims in iter_topk_blocks(engine.matrix, engine.k - 1)])
+    expected = [recs for _, recs in iter_budgeted_recommendations(
+        engine.matrix, engine.movie_ids, np.vstack(neighbors), np.vstack(similarities), 64)]
+    batched = engine.recommend_batch(engine.user_ids.tolist())
+    # The export path keeps float32 similarities, so only the scores' last digits may differ
+    assert [[m for m, _ in recs] for recs in batched] == [[m for m, _ in recs] for recs in expected]
+    np.testing.assert_allclose([s for recs in batched for _, s in recs], [s for recs in expected for _, s in recs],
+                               rtol=1e-5)
+
+
+@pytest.mark.parametrize("user_id", [0, 2, 10 ** 6])
+def test_unknown_user_fails_only_its_own_request(engine, user_id):
+    with pytest.raises(KeyError):
+        engine.recommend_batch([1, user_id])
+
+    batcher = MicroBatcher(engine.recommend_batch, max_batch=8, max_wait_ms=50, validate=engine.check_user)
+    try:
+        futures = [batcher.submit(1), batcher.submit(user_id), batcher.submit(3)]
+        assert futures[0].result() == engine.recommend_batch([1])[0]
+        assert futures[2].result() == engine.recommend_batch([3])[0]
+        with pytest.raises(KeyError):
+            futures[1].result()
+    finally:
+        batcher.close()
+    assert batcher.batch_sizes == [2]
@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ranking_metrics import ranking_metrics
+
+K = 5
+TEST = pd.DataFrame(
+    [(1, 10, 5.0), (1, 11, 4.0), (1, 12, 2.0), (1, 13, 4.5), (1, 14, 3.5), (1, 15, 4.0), (1, 16, 5.0),
+     (2, 20, 4.0), (2, 21, 1.0),
+     (3, 30, 5.0),
+     (5, 50, 3.0), (5, 51, 2.5)],
+    columns=['userId', 'movieId', 'rating'])
+RECOMMENDATIONS = {
+    # Repeated movies, more relevant movies than k, and hits past the cutoff
+    1: [{'movieId': m, 'score': 1.0} for m in (10, 99, 10, 13, 12, 11, 16)],
+    # One relevant movie, fewer than k recommendations
+    2: [(21, 4.0), (20, 3.0)],
+    # No recommendations at all
+    3: [],
+    # No test ratings at all
+    4: [40, 41, 42],
+    # Nothing above the threshold
+    5: [50, 51],
+}
+
+
+def reference(recs, actual, k=K, threshold=3.5):
+    """Straightforward per-user metrics: the first k recommendations, a repeated movie counted once at its first rank"""
+    relevant = set(actual[actual >= threshold].index)
+    # The set-based precision/recall the trainers used before the shared module
+    predicted = {rec['movieId'] if isinstance(rec, dict) else rec[0] if isinstance(rec, tuple) else rec
+                 for rec in recs[:k]}
+    hits = relevant & predicted
+    precision = len(hits) / len(predicted) if predicted else 0.0
+    recall = len(hits) / len(relevant) if relevant else 0.0
+
+    ranked = []
+    for rec in recs[:k]:
+        movie_id = rec['movieId'] if isinstance(rec, dict) else rec[0] if isinstance(rec, tuple) else rec
+        if movie_id not in ranked:
+            ranked.append(movie_id)
+    dcg = sum(1 / math.log2(rank + 2) for rank, movie_id in enumerate(ranked) if movie_id in relevant)
+    ideal = sum(1 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    found, precision_sum = 0, 0.0
+    for rank, movie_id in enumerate(ranked):
+        if movie_id in relevant:
+            found += 1
+            precision_sum += found / (rank + 1)
+    return {
+        'Precision': precision,
+        'Recall': recall,
+        'NDCG': dcg / ideal if ideal else 0.0,
+        'MAP': precision_sum / min(len(relevant), k) if relevant else 0.0,
+        'HitRate': float(bool(hits)),
+    }
+
+
+def test_matches_per_user_reference():
+    metrics = ranking_metrics(RECOMMENDATIONS, TEST, k=K, catalog_size=100)
+    per_user = [reference(recs, TEST[TEST['userId'] == user_id].set_index('movieId')['rating'])
+                for user_id, recs in RECOMMENDATIONS.items()]
+    for name in ('Precision', 'Recall', 'NDCG', 'MAP', 'HitRate'):
+        assert metrics[f'{name}@{K}'] == pytest.approx(np.mean([user[name] for user in per_user]), abs=1e-12), name
+    # 10, 99, 13, 12 / 21, 20 / 40, 41, 42 / 50, 51
+    assert metrics['Coverage'] == pytest.approx(11 / 100)
+
+
+def test_single_user_values():
+    # User 1's first five are 10, 99, 10, 13, 12: four distinct movies, hits at ranks 1 and 3 of 6 relevant
+    metrics = ranking_metrics({1: RECOMMENDATIONS[1]}, TEST, k=K)
+    assert metrics[f'Precision@{K}'] == pytest.approx(2 / 4)
+    assert metrics[f'Recall@{K}'] == pytest.approx(2 / 6)
+    assert metrics[f'MAP@{K}'] == pytest.approx((1 + 2 / 3) / 5)
+
+
+def test_empty_recommendations():
+    assert ranking_metrics({}, TEST) == {}
+    metrics = ranking_metrics({3: []}, TEST, k=K)
+    assert all(value == 0.0 for value in metrics.values())
@@ -0,0 +1,68 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from als_engine import ALSModel
+from conftest import ANALYSIS_DIR
+from neighbor_graph import build_user_item_matrix, load_ratings
+
+# Whole-process budget from launching the interpreter to printed answer; slower CI hosts can raise it
+BUDGET_MS = float(os.environ.get("RECOMMEND_BUDGET_MS", 200))
+SCRIPT = os.path.join(ANALYSIS_DIR, "recommend.py")
+
+
+@pytest.fixture(scope="module")
+def model_path(tmp_path_factory):
+    """A full-size artifact written the way als_engine.py writes it"""
+    ratings = load_ratings(os.path.join(ANALYSIS_DIR, "ratings.csv"))
+    links = pd.read_csv(os.path.join(ANALYSIS_DIR, "links.csv"))
+    matrix, user_ids, movie_ids = build_user_item_matrix(ratings)
+    model = ALSModel(iterations=2).fit(matrix, user_ids, movie_ids)
+    tmdb_ids = links.set_index('movieId')['tmdbId'].reindex(movie_ids).fillna(-1).astype(np.int64).to_numpy()
+    path = str(tmp_path_factory.mktemp("model") / "als_model.npz")
+    model.save(path, seen_indptr=matrix.indptr, seen_indices=matrix.indices, tmdb_ids=tmdb_ids)
+    return path
+
+
+def run_cli(*args):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, SCRIPT, *args], capture_output=True, text=True, cwd=ANALYSIS_DIR)
+    return result, (time.perf_counter() - start) * 1000
+
+
+@pytest.mark.parametrize("query", [["--user", "1"], ["--tmdb-profile", "603:5,27205:4.5"]])
+def test_cold_start_within_budget(model_path, query):
+    # Best of three runs, so a single scheduling hiccup on a busy host does not fail the test
+    runs = [run_cli(*query, "--model", model_path, "--n", "5") for _ in range(3)]
+    for result, _ in runs:
+        assert result.returncode == 0, result.stderr
+        assert len(json.loads(result.stdout)) == 5
+    wall_ms = min(ms for _, ms in runs)
+    assert wall_ms <= BUDGET_MS, f"recommend.py took {wall_ms:.0f} ms end to end (budget {BUDGET_MS:.0f} ms)"
+
+
+def test_budget_flag_counts_interpreter_start_up(model_path):
+    # The child sleeps before recommend.py is even loaded; a clock started at import would not see that time
+    delay_ms = 300
+    launcher = (f"import runpy, sys, time; time.sleep({delay_ms / 1000}); "
+                f"sys.argv = [{SCRIPT!r}, '--user', '1', '--model', {model_path!r}, '--startup-budget-ms', '1']; "
+                f"runpy.run_path({SCRIPT!r}, run_name='__main__')")
+    result = subprocess.run([sys.executable, "-c", launcher], capture_output=True, text=True, cwd=ANALYSIS_DIR)
+    assert result.returncode == 3, result.stderr
+    elapsed_ms = float(re.search(r"Answered (\d+) ms after process start", result.stderr).group(1))
+    assert elapsed_ms >= delay_ms
+    assert "Heavy modules" not in result.stderr
+
+
+@pytest.mark.parametrize("profile", ["603:five", "abc", " , "])
+def test_bad_profile_is_a_usage_error(model_path, profile):
+    result, _ = run_cli("--tmdb-profile", profile, "--model", model_path)
+    assert result.returncode == 2
+    assert "--tmdb-profile:" in result.stderr and "Traceback" not in result.stderr
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from related_items import RelatedItems, build_related_table, related_scores, write_shards
+
+# Users x movies. Liked (>= 4): movie 0 by users 0-2, movie 1 by users 0, 1, 3, movie 2 by user 0, movie 3 by user 3
+MATRIX = sparse.csr_matrix(np.array([
+    [5.0, 4.0, 5.0, 0.0],
+    [4.0, 5.0, 0.0, 0.0],
+    [4.5, 0.0, 2.0, 0.0],
+    [0.0, 4.0, 0.0, 5.0],
+]))
+MOVIE_IDS = np.array([10, 20, 30, 40])
+
+
+def pairs(scores):
+    coo = scores.tocoo()
+    return {(int(i), int(j)): float(v) for i, j, v in zip(coo.row, coo.col, coo.data)}
+
+
+def test_cosine_and_lift_from_liked_counts():
+    cosine = pairs(related_scores(MATRIX, "cosine", min_support=1))
+    # Movies 0 and 1 share two of their three likers each
+    assert cosine[0, 1] == cosine[1, 0] == pytest.approx(2 / np.sqrt(3 * 3))
+    assert cosine[1, 3] == pytest.approx(1 / np.sqrt(3 * 1))
+    # Movie 2's rating of 2.0 does not count, so 0-2 is a single shared liker
+    assert cosine[0, 2] == pytest.approx(1 / np.sqrt(3 * 1))
+    assert all(i != j for i, j in cosine)
+
+    lift = pairs(related_scores(MATRIX, "lift", min_support=1))
+    assert lift[0, 1] == pytest.approx(2 * 4 / (3 * 3))
+    assert lift[1, 3] == pytest.approx(1 * 4 / (3 * 1))
+    assert pairs(related_scores(MATRIX, "count", min_support=1))[0, 1] == 2
+
+
+def test_min_support_drops_rare_pairs():
+    assert set(pairs(related_scores(MATRIX, "lift", min_support=2))) == {(0, 1), (1, 0)}
+    assert related_scores(MATRIX, min_support=3).nnz == 0
+
+
+def test_shared_tmdb_id_keeps_the_most_rated_movie(capsys):
+    # Movies 10 and 30 share tmdbId 500; 10 has three ratings, 30 has two
+    links = pd.DataFrame({"movieId": [10, 20, 30, 40], "tmdbId": [500, 600, 500, 700]})
+    table = build_related_table(MATRIX, MOVIE_IDS, links, k=5, min_support=1)
+
+    assert "tmdbId 500 is shared by movieIds [10, 30]; keeping 10" in capsys.readouterr().out
+    assert sorted(table) == [500, 600, 700]
+    # 500 holds movie 10's list, not movie 30's, and never suggests itself through movie 30
+    assert table[500] == [[600, round(2 / 3, 4)]]
+    for related in table.values():
+        ids = [tmdb_id for tmdb_id, _ in related]
+        assert len(ids) == len(set(ids))
+
+
+def test_shard_lookup_round_trip(tmp_path):
+    links = pd.DataFrame({"movieId": [10, 20, 30, 40], "tmdbId": [500, 601, 502, 703]})
+    table = build_related_table(MATRIX, MOVIE_IDS, links, k=5, min_support=1)
+    out = str(tmp_path / "related")
+    write_shards(table, out, shards=4, meta={"k": 5})
+
+    assert len([name for name in os.listdir(out) if name.startswith("related_")]) == 4
+    related = RelatedItems(out)
+    assert related.meta["movies"] == len(table) and related.meta["k"] == 5
+    for tmdb_id, expected in table.items():
+        assert related.get(tmdb_id) == expected
+    assert related.get(601, n=1) == table[601][:1]
+    assert related.get(999) == []
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from memory_budget import iter_budgeted_recommendations
+from neighbor_graph import build_user_item_matrix, iter_topk_blocks
+from replay_benchmark import PipelineKNN, replay
+
+
+def random_events(n_events=3000, n_users=60, n_movies=300, seed=4):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'userId': rng.integers(1, n_users + 1, n_events) * 7,
+        'movieId': rng.integers(1, n_movies + 1, n_events) * 3,
+        'rating': rng.integers(1, 11, n_events) / 2.0,
+        'timestamp': rng.permutation(n_events),
+    })
+
+
+def test_replayed_model_matches_export_scoring():
+    events = random_events()
+    model = PipelineKNN(k=10)
+    ordered = events.sort_values('timestamp')
+    for start in range(0, len(events), 250):
+        model.add_batch(ordered[['userId', 'movieId', 'rating']].to_numpy()[start:start + 250])
+        model.recommend(int(ordered['userId'].iloc[start]))
+
+    # Re-rated cells keep their latest rating, as in the exporters' deduplicated load
+    latest = ordered.drop_duplicates(subset=['userId', 'movieId'], keep='last')
+    matrix, user_ids, movie_ids = build_user_item_matrix(latest)
+    neighbors, similarities = zip(*[(idx, sims) for _, idx, sims in iter_topk_blocks(matrix, 9)])
+    expected = dict(iter_budgeted_recommendations(matrix, movie_ids, np.vstack(neighbors), np.vstack(similarities), 64))
+    for row, user_id in enumerate(user_ids):
+        got = model.recommend(int(user_id))
+        assert [m for m, _ in got] == [m for m, _ in expected[row]]
+        np.testing.assert_allclose([s for _, s in got], [s for _, s in expected[row]], rtol=1e-5)
+
+
+def test_replay_reports_per_event_latency():
+    results = replay(random_events(500), PipelineKNN(k=5), batch_size=100, queries_per_batch=2)
+    assert results["events"] == 500 and results["batches"] == 5 and results["queries"] == 10
+    # 100 events per batch: microseconds per event x 100 / 1000 = milliseconds per batch
+    assert results["event_update_latency_us"]["max"] / 10 == pytest.approx(results["batch_update_latency_ms"]["max"])
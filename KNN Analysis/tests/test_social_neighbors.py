@@ -0,0 +1,74 @@
+import copy
+import math
+import os
+
+import pytest
+
+from conftest import ANALYSIS_DIR
+from social_neighbors import FRIEND_BOOST, MIN_WATCHED, compute_neighbor_table, load_snapshot
+
+FIXTURE = os.path.join(ANALYSIS_DIR, "sample_social_snapshot.json")
+
+
+def calculate_user_similarity(user1_watched, user2_watched):
+    """Line-by-line port of calculateUserSimilarity in src/services/socialRecs.js"""
+    def ratings(watched):
+        return {f"{item.get('media_type') or 'movie'}_{item['id']}": item.get("rating") or 0
+                for item in watched.values()}
+    r1, r2 = ratings(user1_watched), ratings(user2_watched)
+    common = [key for key in r1 if key in r2]
+    if not common:
+        return 0
+    dot = sum(r1[key] * r2[key] for key in common)
+    norm1 = math.sqrt(sum(r1[key] ** 2 for key in common))
+    norm2 = math.sqrt(sum(r2[key] ** 2 for key in common))
+    if norm1 == 0 or norm2 == 0:
+        return 0
+    return dot / (norm1 * norm2)
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    return load_snapshot(FIXTURE)
+
+
+def neighbors_of(table, uid):
+    return {neighbor: (similarity, is_friend) for neighbor, similarity, is_friend in table[uid]}
+
+
+def test_hand_computed_similarities(snapshot):
+    table = compute_neighbor_table(*snapshot)
+    # maya and theo share 862, 680 and 155: (1*2 + 1*1 + 5*4) / sqrt(27 * 21), boosted because maya lists theo
+    assert neighbors_of(table, "uid_maya")["uid_theo"] == (round(23 / math.sqrt(567) * FRIEND_BOOST, 6), 1)
+    # jonah watched 27205 without rating it, which still makes it a common item (rated 0)
+    assert neighbors_of(table, "uid_jonah")["uid_kai"] == (round(15 / math.sqrt(234), 6), 0)
+    # The boost follows the target's friend list only: kai lists priya, priya does not list kai
+    assert neighbors_of(table, "uid_kai")["uid_priya"] == (1.5, 1)
+    assert neighbors_of(table, "uid_priya")["uid_kai"] == (1.0, 0)
+
+
+def test_matches_the_app_for_every_pair(snapshot):
+    users, watched = snapshot
+    table = compute_neighbor_table(users, watched)
+    for uid in users:
+        expected = {}
+        for other in users:
+            if other == uid or len(watched.get(other, {})) < MIN_WATCHED:
+                continue
+            boost = FRIEND_BOOST if other in users[uid].get("friends", []) else 1.0
+            similarity = calculate_user_similarity(watched[uid], watched[other]) * boost
+            if similarity > 0:
+                expected[other] = round(similarity, 6)
+        assert {neighbor: s for neighbor, (s, _) in neighbors_of(table, uid).items()} == pytest.approx(expected)
+
+
+def test_users_below_min_watched_are_never_neighbors(snapshot):
+    users, watched = snapshot
+    watched = copy.deepcopy(watched)
+    # Down to two watched items kai still overlaps priya on 603, but is no longer a candidate
+    del watched["uid_kai"]["tv_1399"]
+    assert len(watched["uid_kai"]) < MIN_WATCHED
+    table = compute_neighbor_table(users, watched)
+    assert all("uid_kai" not in neighbors_of(table, uid) for uid in users)
+    # kai still gets neighbors of its own, like the app does for any signed-in user
+    assert neighbors_of(table, "uid_kai")["uid_priya"] == (1.5, 1)
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tmdb_enrich import TMDBCache, TMDBClient, enrich_export, fetch_missing
+
+MOVIES = {
+    603: {"title": "The Matrix", "poster_path": "/matrix.jpg", "vote_average": 8.2, "runtime": 136},
+    550: {"title": "Fight Club", "poster_path": "/fight.jpg", "vote_average": 8.4},
+}
+FLAKY = 550        # answers 503 with Retry-After once, then succeeds
+UNKNOWN = 999999   # 404
+BROKEN = 13        # always 500
+
+
+class MockTMDB(BaseHTTPRequestHandler):
+    hits = defaultdict(list)
+
+    def do_GET(self):
+        tmdb_id = int(self.path.split("?")[0].rsplit("/", 1)[1])
+        self.hits[tmdb_id].append(time.perf_counter())
+        if "api_key=test-key" not in self.path:
+            self._send(401, {"status_message": "Invalid API key"})
+        elif tmdb_id == BROKEN:
+            self._send(500, {})
+        elif tmdb_id == FLAKY and len(self.hits[tmdb_id]) == 1:
+            self._send(503, {}, {"Retry-After": "1"})
+        elif tmdb_id in MOVIES:
+            self._send(200, MOVIES[tmdb_id])
+        else:
+            self._send(404, {"status_message": "The resource you requested could not be found."})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    MockTMDB.hits.clear()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), MockTMDB)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/3"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def fetch(base_url, cache, tmdb_ids):
+    client = TMDBClient("test-key", base_url, concurrency=4, retries=2, backoff=0.01, timeout=5)
+    fetched, failed = asyncio.run(fetch_missing(client, cache, tmdb_ids))
+    return fetched, failed, client.requests
+
+
+def test_retries_503_after_retry_after_and_caches_404(server, tmp_path):
+    cache = TMDBCache(str(tmp_path / "cache.json"))
+    fetched, failed, requests = fetch(server, cache, [603, FLAKY, UNKNOWN, BROKEN])
+
+    assert (fetched, failed) == (4, 1)
+    assert cache.get(603) == {"title": "The Matrix", "poster_path": "/matrix.jpg", "vote_average": 8.2}
+    # The 503 is retried once, no sooner than its Retry-After, and then succeeds
+    first, second = MockTMDB.hits[FLAKY]
+    assert second - first >= 0.9
+    assert cache.get(FLAKY)["title"] == "Fight Club"
+    # A 404 is cached as known-missing; a request that kept failing is not cached at all
+    assert cache.get(UNKNOWN) == {}
+    assert cache.get(BROKEN) is None
+    assert len(MockTMDB.hits[UNKNOWN]) == 1
+    assert len(MockTMDB.hits[BROKEN]) == 3
+    assert requests == 1 + 2 + 1 + 3
+
+
+def test_cache_hits_skip_the_server_on_the_next_run(server, tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = TMDBCache(path)
+    fetch(server, cache, [603, UNKNOWN, BROKEN])
+    cache.save()
+    MockTMDB.hits.clear()
+
+    reloaded = TMDBCache(path)
+    fetched, failed, requests = fetch(server, reloaded, [603, UNKNOWN, BROKEN])
+    # Only the id that failed last time is requested again
+    assert (fetched, failed) == (1, 1)
+    assert set(MockTMDB.hits) == {BROKEN}
+    assert requests == 3
+
+
+def test_enrich_prefers_cached_fields_over_offline_titles(tmp_path):
+    cache = TMDBCache(str(tmp_path / "cache.json"))
+    cache.put(603, {"title": "The Matrix", "poster_path": "/matrix.jpg", "vote_average": 8.2})
+    cache.put(UNKNOWN, {})
+    export = {"1": [{"movieId": 2571, "tmdbId": 603, "score": 4.5},
+                    {"movieId": 1, "tmdbId": UNKNOWN, "score": 4.0}]}
+    offline = {603: {"title": "Matrix, The"}, UNKNOWN: {"title": "Offline Title"}}
+
+    recs = enrich_export(export, cache, offline)["1"]
+    assert recs[0] == {"movieId": 2571, "tmdbId": 603, "score": 4.5,
+                       "title": "The Matrix", "poster_path": "/matrix.jpg", "vote_average": 8.2}
+    assert recs[1]["title"] == "Offline Title" and recs[1]["poster_path"] is None
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from inverted_index import long_tail_matrix
+from two_stage import TwoStageRecommender
+
+
+@pytest.fixture(scope="module")
+def matrix():
+    return long_tail_matrix(120, 600, ratings_per_user=30, exponent=0.8, seed=9)
+
+
+def proposals(model, row):
+    """(column, weight, rating) of every neighbor favorite, the user's own row left out"""
+    indptr, indices, values = model.favorites
+    out = []
+    for neighbor, weight in zip(model.neighbors[row], model.weights[row]):
+        if neighbor != row:
+            for i in range(indptr[neighbor], min(indptr[neighbor] + model.per_neighbor, indptr[neighbor + 1])):
+                out.append((indices[i], weight, values[i]))
+    return out
+
+
+def test_own_row_is_dropped_wherever_it_ranks(matrix):
+    model = TwoStageRecommender(k=10, candidates=10 ** 6).fit(matrix, np.arange(120), np.arange(600))
+    row = 5
+    # As with a duplicate user sorting first: the user is no longer its own first neighbor
+    model.neighbors[row] = np.roll(model.neighbors[row], 1)
+    model.weights[row] = np.roll(model.weights[row], 1)
+    assert model.neighbors[row][0] != row
+    seen = set(matrix[row].indices)
+    expected = sorted({c for c, _, _ in proposals(model, row)} - seen)
+    assert model.generate(row).tolist() == expected
+
+
+@pytest.mark.parametrize("scorer", ["sklearn", "simple"])
+def test_budget_keeps_the_candidates_the_scorer_favors(matrix, scorer):
+    model = TwoStageRecommender(k=10, candidates=15, scorer=scorer).fit(matrix, np.arange(120), np.arange(600))
+    for row in range(0, 120, 17):
+        seen = set(matrix[row].indices)
+        stats = {}
+        for column, weight, rating in proposals(model, row):
+            if column not in seen:
+                votes, weighted, support = stats.get(column, (0, 0.0, 0.0))
+                stats[column] = (votes + 1, weighted + weight * rating, support + weight)
+        if scorer == "simple":
+            key = {c: (-w / s, -v, c) for c, (v, w, s) in stats.items()}
+        else:
+            key = {c: (-v, -w, c) for c, (v, w, s) in stats.items()}
+        expected = sorted(sorted(stats, key=key.get)[:15])
+        assert model.generate(row).tolist() == expected
+
+
+def test_cooccurrence_cannot_feed_the_simple_scorer():
+    with pytest.raises(ValueError, match="simple scorer"):
+        TwoStageRecommender(generator="cooccurrence", scorer="simple")
@@ -0,0 +1,194 @@
+# pip install pandas
+# Attach TMDB title, poster and rating to exported recommendations with a persistent local cache
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pandas as pd
+
+TMDB_BASE = "https://api.themoviedb.org/3"
+FIELDS = ("title", "poster_path", "vote_average")
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def read_api_key(env_path=os.path.join("..", ".env")):
+    """TMDB key from TMDB_API_KEY / VITE_TMDB_API_KEY, falling back to the app's .env file"""
+    for name in ("TMDB_API_KEY", "VITE_TMDB_API_KEY"):
+        if os.environ.get(name):
+            return os.environ[name]
+    if os.path.exists(env_path):
+        with open(env_path, "r") as f:
+            for line in f:
+                name, _, value = line.strip().partition("=")
+                if name in ("TMDB_API_KEY", "VITE_TMDB_API_KEY") and value:
+                    return value.strip().strip('"')
+    return None
+
+
+def clean_title(title):
+    """'American President, The (1995)' -> 'The American President'"""
+    title = re.sub(r"\s*\(\d{4}\)\s*$", "", str(title)).strip()
+    match = re.match(r"^(.*), (The|A|An)$", title)
+    return f"{match.group(2)} {match.group(1)}" if match else title
+
+
+def load_offline_metadata(movies_path="ml-latest-small/movies.csv", links_path="links.csv"):
+    """{tmdbId: {'title': ...}} from the MovieLens files, used when TMDB is not needed or not reachable"""
+    try:
+        movies = pd.read_csv(movies_path)
+        links = pd.read_csv(links_path)
+    except FileNotFoundError:
+        return {}
+    merged = links.dropna(subset=['tmdbId']).merge(movies, on='movieId')
+    return {int(tmdb_id): {"title": clean_title(title)} for tmdb_id, title in zip(merged.tmdbId, merged.title)}
+
+
+class TMDBCache:
+    """tmdbId -> metadata, persisted to a JSON file so every id is fetched at most once"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+        self.dirty = False
+
+    def get(self, tmdb_id):
+        return self.entries.get(str(tmdb_id))
+
+    def put(self, tmdb_id, metadata):
+        self.entries[str(tmdb_id)] = metadata
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        # Write to a temp file first so an interrupted run never corrupts the cache
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+class TMDBClient:
+    """Asyncio TMDB client with bounded concurrency and retry with exponential backoff"""
+
+    def __init__(self, api_key, base_url=TMDB_BASE, concurrency=8, retries=4, backoff=0.5, timeout=10.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.requests = 0
+
+    def _get(self, url):
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    async def movie(self, tmdb_id):
+        """Fetch /movie/{id}; returns None when TMDB does not know the id"""
+        query = urllib.parse.urlencode({"api_key": self.api_key})
+        url = f"{self.base_url}/movie/{int(tmdb_id)}?{query}"
+
+        for attempt in range(self.retries + 1):
+            async with self.semaphore:
+                self.requests += 1
+                try:
+                    data = await asyncio.to_thread(self._get, url)
+                    return {field: data.get(field) for field in FIELDS}
+                except urllib.error.HTTPError as e:
+                    if e.code == 404:
+                        return None
+                    if e.code not in RETRY_STATUSES or attempt == self.retries:
+                        raise
+                    retry_after = e.headers.get("Retry-After") if e.headers else None
+                except (urllib.error.URLError, TimeoutError):
+                    if attempt == self.retries:
+                        raise
+                    retry_after = None
+            # Sleep outside the semaphore so waiting retries don't block other requests
+            delay = float(retry_after) if retry_after else self.backoff * (2 ** attempt)
+            await asyncio.sleep(delay + random.uniform(0, self.backoff))
+
+
+async def fetch_missing(client, cache, tmdb_ids):
+    """Fetch every id not yet cached; failures are reported but don't stop the run"""
+    missing = sorted({int(t) for t in tmdb_ids if cache.get(t) is None})
+    results = await asyncio.gather(*(client.movie(t) for t in missing), return_exceptions=True)
+
+    failed = 0
+    for tmdb_id, result in zip(missing, results):
+        if isinstance(result, Exception):
+            failed += 1
+            continue
+        # Cache unknown ids too, so they are not requested again on the next run
+        cache.put(tmdb_id, result or {})
+    return len(missing), failed
+
+
+def enrich_export(export, cache, offline):
+    """Copy of export with title, poster_path and vote_average on every recommendation"""
+    enriched = {}
+    for user_id, recs in export.items():
+        enriched[user_id] = []
+        for rec in recs:
+            metadata = {field: None for field in FIELDS}
+            metadata.update(offline.get(int(rec["tmdbId"]), {}))
+            cached = cache.get(rec["tmdbId"]) or {}
+            metadata.update({field: value for field, value in cached.items() if value is not None})
+            enriched[user_id].append({**rec, **metadata})
+    return enriched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich exported recommendations with TMDB metadata")
+    parser.add_argument("export", help="export to enrich, e.g. knn_recs_sklearn.json")
+    parser.add_argument("--out", help="defaults to <export>.enriched.json")
+    parser.add_argument("--cache", default="tmdb_cache.json")
+    parser.add_argument("--base-url", default=TMDB_BASE, help="TMDB API base URL (point at a mock server for tests)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument("--offline", action="store_true", help="only use movies.csv and the cache")
+    args = parser.parse_args()
+
+    with open(args.export, "r") as f:
+        export = json.load(f)
+    out = args.out or re.sub(r"\.json$", "", args.export) + ".enriched.json"
+
+    offline = load_offline_metadata()
+    cache = TMDBCache(args.cache)
+    tmdb_ids = {rec["tmdbId"] for recs in export.values() for rec in recs}
+    print(f"{len(tmdb_ids)} distinct TMDB ids, {sum(1 for t in tmdb_ids if cache.get(t) is not None)} cached, "
+          f"{sum(1 for t in tmdb_ids if int(t) in offline)} with offline titles")
+
+    if not args.offline:
+        api_key = read_api_key()
+        if not api_key:
+            print("No TMDB API key found (set TMDB_API_KEY); falling back to offline metadata")
+        else:
+            client = TMDBClient(api_key, args.base_url, args.concurrency, args.retries)
+            start = time.perf_counter()
+            try:
+                fetched, failed = asyncio.run(fetch_missing(client, cache, tmdb_ids))
+            finally:
+                cache.save()
+            print(f"Fetched {fetched - failed} ids ({failed} failed, {client.requests} requests) "
+                  f"in {time.perf_counter() - start:.2f}s")
+
+    with open(out, "w") as f:
+        json.dump(enrich_export(export, cache, offline), f, indent=2)
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()